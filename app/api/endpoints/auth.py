@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from datetime import timedelta
 from typing import Optional
+from pydantic import ValidationError
 
 from ...core.security import verify_password, get_password_hash, create_access_token, generate_verification_token
 from ...core import config
-from ...models.user import UserCreate, UserResponse, Token, UserLogin, UserType, TokenData
-from ...db.database import add_user, find_user_by_email, find_user_by_username, store_verification_token, verify_token
-from ...utils.email import send_verification_email
+from ...models.user import UserCreate, UserResponse, Token, UserLogin, UserType, TokenData, BulkImportResult, BulkImportError, BulkImportUser, InviteAcceptance
+from ...db.database import add_user, add_users_bulk, find_user_by_email, find_user_by_username, store_verification_token, verify_token, accept_invite
+from ...utils.email import send_verification_email, send_verification_emails
+from ...utils.bulk_import import parse_user_rows, hash_passwords
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
@@ -113,8 +115,132 @@ async def signup(user: UserCreate):
     # Return only a message
     return {"message": "User registered successfully. Please check your email to verify your account."}
 
+@router.post("/bulk-import", response_model=BulkImportResult)
+async def bulk_import_users(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    user = Depends(get_ops_user)
+):
+    """Create many client users from a CSV or JSON file (only for operations users)"""
+    try:
+        rows = parse_user_rows(await file.read(), file.filename)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    if len(rows) > config.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many users in one import. Maximum is {config.BULK_IMPORT_MAX_ROWS}"
+        )
+    
+    errors = []
+    valid = []  # (row number, BulkImportUser)
+    seen_emails = set()
+    seen_usernames = set()
+    
+    # Validate rows and catch duplicates inside the file itself
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            new_user = BulkImportUser(**row)
+        except (ValidationError, TypeError) as e:
+            detail = e.errors()[0]["msg"] if isinstance(e, ValidationError) else str(e)
+            # The email is only echoed back when it is at least a string
+            email = row.get("email")
+            errors.append(BulkImportError(
+                row=row_number,
+                email=email if isinstance(email, str) else None,
+                detail=detail
+            ))
+            continue
+        if new_user.email in seen_emails:
+            errors.append(BulkImportError(row=row_number, email=new_user.email, detail="Duplicate email in import file"))
+            continue
+        if new_user.username in seen_usernames:
+            errors.append(BulkImportError(row=row_number, email=new_user.email, detail="Duplicate username in import file"))
+            continue
+        seen_emails.add(new_user.email)
+        seen_usernames.add(new_user.username)
+        valid.append((row_number, new_user))
+    
+    # Rows without a password are invites and need no hashing; bcrypt is
+    # far too slow to hash tens of thousands of passwords inside a request
+    passwords = [new_user.password for _, new_user in valid if new_user.password]
+    if len(passwords) > config.BULK_IMPORT_MAX_PASSWORD_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=(
+                f"Too many users with passwords in one import. Maximum is {config.BULK_IMPORT_MAX_PASSWORD_ROWS}; "
+                "leave the password out to invite users instead"
+            )
+        )
+    
+    # Hash the given passwords in parallel instead of one blocking call per user
+    hashed_passwords = iter(await hash_passwords(passwords))
+    
+    # Invited users get an empty hash and choose a password on acceptance
+    user_docs = [
+        {
+            "username": new_user.username,
+            "email": new_user.email,
+            "hashed_password": next(hashed_passwords) if new_user.password else "",
+            "user_type": UserType.CLIENT,
+            "is_verified": False,
+            "verification_token": generate_verification_token()
+        }
+        for _, new_user in valid
+    ]
+    
+    # Insert in batches; existing emails/usernames surface as duplicate-key errors
+    recipients = []
+    invitees = []
+    for start in range(0, len(user_docs), config.BULK_IMPORT_BATCH_SIZE):
+        batch = user_docs[start:start + config.BULK_IMPORT_BATCH_SIZE]
+        write_errors = await add_users_bulk(batch)
+        failed_indexes = set()
+        for write_error in write_errors:
+            index = write_error["index"]
+            failed_indexes.add(index)
+            if write_error.get("code") == 11000:
+                key = next(iter(write_error.get("keyValue") or {}), "")
+                detail = "Username already taken" if key == "username" else "Email already registered"
+            else:
+                detail = write_error.get("errmsg", "Failed to create user")
+            errors.append(BulkImportError(
+                row=valid[start + index][0],
+                email=batch[index]["email"],
+                detail=detail
+            ))
+        for index, doc in enumerate(batch):
+            if index not in failed_indexes:
+                (recipients if doc["hashed_password"] else invitees).append((doc["email"], doc["verification_token"]))
+    
+    # Verification and invitation emails go out after the response, batched
+    # per SMTP connection
+    if recipients:
+        background_tasks.add_task(send_verification_emails, recipients)
+    if invitees:
+        background_tasks.add_task(send_verification_emails, invitees, invite=True)
+    
+    errors.sort(key=lambda error: error.row)
+    return BulkImportResult(
+        total=len(rows),
+        created=len(recipients) + len(invitees),
+        failed=len(errors),
+        errors=errors
+    )
+
 @router.get("/verify")
 async def verify_email(email: str = Query(...), token: str = Query(...)):
+    user = await find_user_by_email(email)
+    if user and user.get("hashed_password") == "":
+        # Verifying would leave an invited user without a way to log in
+        raise HTTPException(
+            status_code=400,
+            detail="Invited users must choose a password through /auth/accept-invite"
+        )
     if await verify_token(email, token):
         return {"message": "Email verified successfully. You can now log in."}
     raise HTTPException(
@@ -122,6 +248,17 @@ async def verify_email(email: str = Query(...), token: str = Query(...)):
         detail="Invalid or expired verification token"
     )
 
+@router.post("/accept-invite")
+async def accept_user_invite(acceptance: InviteAcceptance, email: str = Query(...), token: str = Query(...)):
+    """Choose a password for a user invited through a bulk import"""
+    hashed_password = get_password_hash(acceptance.password)
+    if await accept_invite(email, token, hashed_password):
+        return {"message": "Invitation accepted successfully. You can now log in."}
+    raise HTTPException(
+        status_code=400,
+        detail="Invalid or expired invitation token"
+    )
+
 @router.post("/resend-verification")
 async def resend_verification_email(email: str = Query(...)):
     # Check if user exists
@@ -145,8 +282,11 @@ async def resend_verification_email(email: str = Query(...)):
     # Store the new token
     await store_verification_token(email, verification_token)
     
-    # Send verification email
-    email_sent = await send_verification_email(email, verification_token)
+    # Send verification email, or the invitation again for invited users
+    if user.get("hashed_password") == "":
+        email_sent = await send_verification_emails([(email, verification_token)], invite=True) > 0
+    else:
+        email_sent = await send_verification_email(email, verification_token)
     
     if not email_sent and not config.BYPASS_EMAIL_VERIFICATION:
         raise HTTPException(
@@ -160,7 +300,8 @@ async def authenticate_user(email: str, password: str):
     user = await find_user_by_email(email)
     if not user:
         return False
-    if not verify_password(password, user["hashed_password"]):
+    # Invited users have no password until they accept the invitation
+    if not user.get("hashed_password") or not verify_password(password, user["hashed_password"]):
         return False
     # Check if user is verified
     if not user.get("is_verified", False):
@@ -1,14 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, status, Path, Query
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from typing import List, Optional
+from urllib.parse import quote
 import os
-import shutil
+import secrets
 from datetime import datetime
 
 from ...core import config
 from ...core.security import encrypt_url, decrypt_url
-from ...models.user import FileResponse as FileResponseModel
-from ...db.database import add_file, get_file_by_id, list_all_files
+from ...models.user import FileResponse as FileResponseModel, AuditEvent, StorageUsage, FileVersion
+from ...db.database import (
+    add_file, delete_file, get_file_by_id, list_all_files, query_audit_events,
+    get_storage_usage, reconcile_storage_usage, GLOBAL_USAGE_ID,
+    add_file_version, chunk_file, list_file_versions, get_file_version, list_referenced_chunks
+)
+from ...db.audit import audit_logger
+from ...db.stats import download_stats
+from ...db.events import catalog_events, format_reset
+from ...utils.serialization import file_to_dict, version_to_dict, audit_event_to_dict, json_response
+from ...utils.chunking import chunk_store, ContentTooLarge
+from ...utils.uploads import receive_upload, UploadTooLarge, InvalidUpload
 from .auth import get_ops_user, get_client_user, get_verified_user
 
 router = APIRouter()
@@ -18,74 +30,361 @@ def validate_file_extension(filename: str) -> bool:
     ext = filename.split(".")[-1].lower()
     return ext in config.ALLOWED_EXTENSIONS
 
-@router.post("/upload", response_model=FileResponseModel)
-async def upload_file(file: UploadFile = File(...), user = Depends(get_ops_user)):
-    """Upload a file (only for operations users)"""
+async def check_storage_quota(user_id: str, incoming_bytes: int) -> Optional[int]:
+    """Reject the upload if it would exceed the user's or the global quota.
     
-    # Validate file extension
-    if not validate_file_extension(file.filename):
+    Returns the number of bytes the upload may still write, or None when no
+    quota applies.
+    """
+    usage = await get_storage_usage(user_id)
+    user_usage = usage.get(user_id, {})
+    global_usage = usage.get(GLOBAL_USAGE_ID, {})
+    
+    remaining = None
+    limits = [
+        (user_usage.get("quota", config.USER_STORAGE_QUOTA_BYTES), user_usage.get("bytes", 0), "Storage quota exceeded"),
+        (config.GLOBAL_STORAGE_QUOTA_BYTES, global_usage.get("bytes", 0), "Server storage quota exceeded")
+    ]
+    for quota, used, detail in limits:
+        if not quota:
+            continue
+        if used + incoming_bytes > quota:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=detail
+            )
+        remaining = quota - used if remaining is None else min(remaining, quota - used)
+    return remaining
+
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
+    }
+}
+
+async def convert_to_chunks(file: dict) -> dict:
+    """Move a file stored whole into chunk storage as its version 1.
+    
+    Files are only chunked once they get a second version, so first
+    uploads stay a plain copy.
+    """
+    file_id = str(file["_id"])
+    try:
+        content = await chunk_store.store_file(file["file_path"], None)
+    except FileNotFoundError:
+        # A concurrent upload may have converted it and removed the original
+        content = None
+    
+    converted = None
+    if content:
+        converted = await chunk_file(file_id, {
+            "stored_bytes": content.new_bytes,
+            "chunks": content.chunks,
+            "chunk_sizes": content.chunk_sizes
+        })
+    if converted:
+        if os.path.exists(file["file_path"]):
+            os.remove(file["file_path"])
+        return converted
+    
+    file = await get_file_by_id(file_id)
+    if not file:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed types: {', '.join(config.ALLOWED_EXTENSIONS)}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    if file.get("storage") != "chunks":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found on server"
         )
+    return file
+
+@router.post("/upload", response_model=FileResponseModel, openapi_extra=UPLOAD_REQUEST_BODY)
+async def upload_file(
+    request: Request,
+    file_id: Optional[str] = Query(None, description="Upload a new version of this file"),
+    user = Depends(get_ops_user)
+):
+    """Upload a file, or a new version of an existing file (only for operations users)"""
+    
+    # A new version is charged to the file's owner
+    existing_file = None
+    owner_id = user["user_id"]
+    if file_id:
+        existing_file = await get_file_by_id(file_id)
+        if not existing_file:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found"
+            )
+        owner_id = existing_file["uploaded_by"]
     
-    # Create a unique filename
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    file_extension = file.filename.split(".")[-1]
-    unique_filename = f"{user['username']}_{timestamp}.{file_extension}"
-    file_path = os.path.join(config.UPLOAD_DIR, unique_filename)
+    # Check quotas before the body is read, using Content-Length when sent
+    content_length = request.headers.get("content-length")
+    incoming_bytes = int(content_length) if content_length and content_length.isdigit() else 0
+    # New versions mostly reuse stored chunks, so only new files are checked up front
+    remaining = await check_storage_quota(owner_id, 0 if existing_file else incoming_bytes)
     
-    # Save the file
+    def check_filename(filename: str):
+        # Runs as soon as the part headers arrive, before any file data is read
+        if not validate_file_extension(filename):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"File type not allowed. Allowed types: {', '.join(config.ALLOWED_EXTENSIONS)}"
+            )
+        if existing_file and filename.split(".")[-1].lower() != existing_file["file_type"].lower():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"A new version must have the same file type ({existing_file['file_type']})"
+            )
+    
+    # Stream the body to a spool file, keeping a running count against the
+    # size limit (and the quota for new files) as it arrives
+    limit = config.MAX_FILE_SIZE
+    if not existing_file and remaining is not None:
+        limit = min(limit, remaining)
+    spool_path = os.path.join(config.UPLOAD_DIR, f".upload-{secrets.token_hex(8)}")
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        filename, written = await receive_upload(request, spool_path, limit, check_filename=check_filename)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="File too large" if limit == config.MAX_FILE_SIZE else "Storage quota exceeded"
+        )
+    except InvalidUpload as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to save file: {str(e)}"
         )
+    file_extension = filename.split(".")[-1]
     
-    # Save file metadata to database
-    file_data = {
-        "filename": file.filename,
-        "stored_filename": unique_filename,
-        "file_path": file_path,
-        "file_type": file_extension,
-        "size": os.path.getsize(file_path),
-        "uploaded_by": user["user_id"]
-    }
-    
-    saved_file = await add_file(file_data)
+    if not existing_file:
+        # A first upload is stored whole; it is only chunked if it gets a new version
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        unique_filename = f"{user['username']}_{timestamp}_{secrets.token_hex(4)}.{file_extension}"
+        file_path = os.path.join(config.UPLOAD_DIR, unique_filename)
+        os.replace(spool_path, file_path)
+        
+        # Save file metadata to database
+        file_data = {
+            "filename": filename,
+            "stored_filename": unique_filename,
+            "file_path": file_path,
+            "file_type": file_extension,
+            "size": written,
+            "uploaded_by": user["user_id"]
+        }
+        saved_file = await add_file(file_data)
+        catalog_events.file_uploaded(saved_file)
+    else:
+        try:
+            if existing_file.get("storage") != "chunks":
+                existing_file = await convert_to_chunks(existing_file)
+            
+            # Split into content-defined chunks and store only the chunks not
+            # already present. The file is charged for chunks its earlier
+            # versions lack, checked against the quota as they are counted
+            known_chunks = frozenset(await list_referenced_chunks(file_id))
+            try:
+                content = await chunk_store.store_file(spool_path, config.MAX_FILE_SIZE, remaining, known_chunks)
+            except ContentTooLarge as e:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=str(e)
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to save file: {str(e)}"
+                )
+        finally:
+            os.remove(spool_path)
+        
+        saved_file = await add_file_version(file_id, {
+            "filename": filename,
+            "size": content.size,
+            "stored_bytes": content.new_bytes,
+            "chunks": content.chunks,
+            "chunk_sizes": content.chunk_sizes,
+            "uploaded_by": user["user_id"]
+        })
+        if not saved_file:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found"
+            )
+        catalog_events.file_updated(saved_file)
     
     return FileResponseModel(
         id=str(saved_file["_id"]),
         filename=saved_file["filename"],
         file_type=saved_file["file_type"],
         size=saved_file["size"],
-        upload_date=saved_file["upload_date"]
+        upload_date=saved_file["upload_date"],
+        version=saved_file.get("version", 1)
     )
 
 @router.get("/list", response_model=List[FileResponseModel])
-async def list_files(user = Depends(get_verified_user)):
+async def list_files(
+    limit: int = Query(100, ge=1, le=config.LIST_MAX_PAGE_SIZE),
+    user = Depends(get_verified_user)
+):
     """List all available files (for both client and OPS users)"""
-    files = await list_all_files()
-    
-    return [
-        FileResponseModel(
-            id=str(file["_id"]),
-            filename=file["filename"],
-            file_type=file["file_type"],
-            size=file["size"],
-            upload_date=file["upload_date"]
-        ) for file in files
-    ]
+    files = await list_all_files(limit)
+    
+    # Encode documents directly instead of building and re-validating models
+    return json_response(file_to_dict(file) for file in files)
+
+@router.get("/top", response_model=List[FileResponseModel])
+async def list_top_files(
+    limit: int = Query(10, ge=1, le=config.STATS_RANKING_SIZE),
+    user = Depends(get_ops_user)
+):
+    """List the most downloaded files (only for operations users)"""
+    files = download_stats.top_files(limit)
+    
+    return json_response(file_to_dict(file) for file in files)
+
+@router.get("/events")
+async def stream_events(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user = Depends(get_verified_user)
+):
+    """Stream file upload, update and delete events as server-sent events.
+    
+    Reconnect with the Last-Event-ID header (or ``last_event_id``) to resume.
+    A ``reset`` event means events were missed: re-fetch /files/list and
+    reconnect without an event id.
+    """
+    if catalog_events.subscriber_count >= catalog_events.max_subscribers:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many event stream subscribers, try again later"
+        )
+    
+    async def event_stream():
+        # Subscribe inside the generator so cleanup always runs with it
+        subscriber, replay = catalog_events.subscribe(last_event_id_header or last_event_id)
+        if subscriber is None:
+            yield format_reset("too many subscribers")
+            return
+        try:
+            for frame in replay:
+                yield frame
+            while True:
+                if subscriber.overflowed:
+                    yield format_reset("client too slow")
+                    return
+                frame = await subscriber.queue.get()
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            catalog_events.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.delete("/{file_id}")
+async def remove_file(file_id: str, user = Depends(get_ops_user)):
+    """Delete a file (only for operations users)"""
+    file = await delete_file(file_id)
+    
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    # Chunked files leave their chunks for garbage collection, since other
+    # files may share them
+    if file.get("file_path") and os.path.exists(file["file_path"]):
+        os.remove(file["file_path"])
+    
+    catalog_events.file_deleted(file_id)
+    
+    return {"message": "File deleted successfully"}
+
+@router.get("/{file_id}/versions", response_model=List[FileVersion])
+async def get_file_versions(file_id: str, user = Depends(get_verified_user)):
+    """List the versions of a file, oldest first (for all verified users)"""
+    file = await get_file_by_id(file_id)
+    
+    if not file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    
+    versions = await list_file_versions(file_id)
+    
+    return json_response(version_to_dict(version) for version in versions)
+
+@router.post("/chunks/gc")
+async def collect_chunk_garbage(user = Depends(get_ops_user)):
+    """Delete stored chunks no file version references (only for operations users)"""
+    candidates = await run_in_threadpool(
+        chunk_store.find_unreferenced, await list_referenced_chunks(), config.CHUNK_GC_GRACE_SECONDS
+    )
+    # Re-check against versions recorded while the store was being walked
+    referenced = await list_referenced_chunks()
+    removed, freed = await run_in_threadpool(
+        chunk_store.remove_chunks,
+        [digest for digest in candidates if digest not in referenced],
+        config.CHUNK_GC_GRACE_SECONDS
+    )
+    
+    return {"chunks_removed": removed, "bytes_freed": freed}
+
+@router.get("/usage", response_model=StorageUsage)
+async def get_usage(user = Depends(get_ops_user)):
+    """Get the current user's storage usage and quota (only for operations users)"""
+    usage = (await get_storage_usage(user["user_id"])).get(user["user_id"], {})
+    quota = usage.get("quota", config.USER_STORAGE_QUOTA_BYTES)
+    
+    return StorageUsage(
+        bytes_used=usage.get("bytes", 0),
+        files=usage.get("files", 0),
+        quota_bytes=quota or None
+    )
+
+@router.post("/usage/reconcile")
+async def reconcile_usage(user = Depends(get_ops_user)):
+    """Recompute storage usage counters from file metadata (only for operations users)"""
+    return await reconcile_storage_usage()
 
 @router.get("/download/{file_id}")
-async def get_download_url(file_id: str, user = Depends(get_verified_user)):
+async def get_download_url(
+    file_id: str,
+    request: Request,
+    version: Optional[int] = Query(None, ge=1, description="Defaults to the current version"),
+    user = Depends(get_verified_user)
+):
     """Get a secure download URL for a file (for all verified users)"""
     file = await get_file_by_id(file_id)
     
-    if not file:
+    if not file or (version and version > file.get("version", 1)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
@@ -94,11 +393,24 @@ async def get_download_url(file_id: str, user = Depends(get_verified_user)):
     # Generate encrypted download URL
     encrypted_url = encrypt_url(file_id, user["user_id"])
     download_url = f"http://localhost:8000/files/secure-download?token={encrypted_url}"
+    if version:
+        download_url += f"&version={version}"
+    
+    await audit_logger.record(
+        "download_url",
+        user["user_id"],
+        file_id,
+        ip_address=request.client.host if request.client else None
+    )
     
     return {"download_url": download_url}
 
 @router.get("/secure-download")
-async def secure_download(token: str = Query(...)):
+async def secure_download(
+    request: Request,
+    token: str = Query(...),
+    version: Optional[int] = Query(None, ge=1)
+):
     """Download a file using a secure token"""
     # Decrypt the token
     decrypted_data = decrypt_url(token)
@@ -120,17 +432,80 @@ async def secure_download(token: str = Query(...)):
             detail="File not found"
         )
     
-    # Check if the file exists on disk
-    file_path = file["file_path"]
-    if not os.path.exists(file_path):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found on server"
-        )
+    if file.get("storage") == "chunks":
+        # Reassemble the requested version from its chunks as a stream
+        file_version = await get_file_version(file_id, version or file["version"])
+        if not file_version:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File version not found"
+            )
+        if not await run_in_threadpool(chunk_store.has_all, file_version["chunks"]):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found on server"
+            )
+        filename = file_version["filename"]
+        size = file_version["size"]
+    else:
+        # Files that never got a second version are stored whole, as version 1
+        file_path = file["file_path"]
+        if (version and version != 1) or not os.path.exists(file_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found on server"
+            )
+        filename = file["filename"]
+        size = file["size"]
+    
+    # Record who downloaded the file; buffered, so this does not hit the metadata store here
+    await audit_logger.record(
+        "download",
+        user_id,
+        file_id,
+        ip_address=request.client.host if request.client else None
+    )
+    
+    # Counted in memory and flushed to the metadata store in bulk
+    download_stats.record(file_id, size)
     
     # Return the file
-    return FileResponse(
-        path=file_path, 
-        filename=file["filename"],
-        media_type="application/octet-stream"
-    ) 
\ No newline at end of file
+    if file.get("storage") != "chunks":
+        return FileResponse(
+            path=file_path, 
+            filename=filename,
+            media_type="application/octet-stream"
+        )
+    
+    quoted_filename = quote(filename)
+    if quoted_filename == filename:
+        content_disposition = f'attachment; filename="{filename}"'
+    else:
+        content_disposition = f"attachment; filename*=utf-8''{quoted_filename}"
+    return StreamingResponse(
+        chunk_store.iter_content(file_version["chunks"]),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": content_disposition, "Content-Length": str(size)}
+    )
+
+@router.get("/audit", response_model=List[AuditEvent])
+async def list_audit_events(
+    user_id: Optional[str] = Query(None),
+    file_id: Optional[str] = Query(None),
+    action: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    user = Depends(get_ops_user)
+):
+    """Query the download and access audit log (only for operations users)"""
+    events = await query_audit_events(
+        user_id=user_id,
+        file_id=file_id,
+        action=action,
+        since=since,
+        until=until,
+        limit=limit
+    )
+    
+    return json_response(audit_event_to_dict(event) for event in events)
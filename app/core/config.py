@@ -8,6 +8,11 @@ load_dotenv()
 # Base directory
 BASE_DIR = pathlib.Path(__file__).parent.parent.parent
 
+# Metadata backend: "mongo", "sqlite" or "memory"
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "mongo").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(BASE_DIR, "metadata.db"))
+SQLITE_READ_WORKERS = int(os.getenv("SQLITE_READ_WORKERS", "4"))  # Reader threads, each with its own connection
+
 # MongoDB settings
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "file_sharing_db")
@@ -26,6 +31,31 @@ MAIL_PORT = int(os.getenv("MAIL_PORT", "587"))
 MAIL_SERVER = os.getenv("MAIL_SERVER", "")
 MAIL_TLS = True
 MAIL_SSL = False
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))  # Emails sent per SMTP connection
+
+# Bulk user import settings
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "50000"))
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "1000"))  # Documents per insert_many
+BULK_IMPORT_HASH_WORKERS = int(os.getenv("BULK_IMPORT_HASH_WORKERS", str(os.cpu_count() or 4)))
+BULK_IMPORT_MAX_PASSWORD_ROWS = int(os.getenv("BULK_IMPORT_MAX_PASSWORD_ROWS", "200"))  # Rows hashed inside the request; the rest must be invites
+
+# Audit log settings
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))  # Events per insert_many
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "10000"))  # Events buffered before record() blocks
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+
+# Download statistics settings
+STATS_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATS_FLUSH_INTERVAL_SECONDS", "10.0"))
+STATS_RANKING_SIZE = int(os.getenv("STATS_RANKING_SIZE", "100"))  # Files kept in the top files ranking
+
+# Catalog event stream settings
+EVENTS_HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY_SIZE", "1000"))  # Events kept for resuming
+EVENTS_SUBSCRIBER_BUFFER = int(os.getenv("EVENTS_SUBSCRIBER_BUFFER", "256"))  # Queued events before a client is dropped
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15.0"))
+EVENTS_MAX_SUBSCRIBERS = int(os.getenv("EVENTS_MAX_SUBSCRIBERS", "50000"))  # Per worker
+EVENTS_MAX_CATCH_UPS = int(os.getenv("EVENTS_MAX_CATCH_UPS", "8"))  # Per worker; each holds a Motor thread while it waits
+EVENTS_RETRY_SECONDS = float(os.getenv("EVENTS_RETRY_SECONDS", "5.0"))
 
 # Development settings
 DEV_MODE = os.getenv("DEV_MODE", "false").lower() == "true"
@@ -35,6 +65,20 @@ BYPASS_EMAIL_VERIFICATION = os.getenv("BYPASS_EMAIL_VERIFICATION", "false").lowe
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))  # Default 50 MB
 ALLOWED_EXTENSIONS = os.getenv("ALLOWED_EXTENSIONS", "pptx,docx,xlsx").split(",")
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "10000"))  # Largest page /files/list will return
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # Default 1 MB
+
+# Content-defined chunk storage for file versions
+CHUNK_DIR = os.getenv("CHUNK_DIR", os.path.join(UPLOAD_DIR, "chunks"))
+CHUNK_MIN_SIZE = int(os.getenv("CHUNK_MIN_SIZE", str(8 * 1024)))
+CHUNK_AVG_SIZE = int(os.getenv("CHUNK_AVG_SIZE", str(32 * 1024)))
+CHUNK_MAX_SIZE = int(os.getenv("CHUNK_MAX_SIZE", str(128 * 1024)))
+CHUNK_GC_GRACE_SECONDS = int(os.getenv("CHUNK_GC_GRACE_SECONDS", "3600"))  # Unreferenced chunks younger than this are kept
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "2"))  # Processes that chunk new versions
+
+# Storage quota settings (0 means unlimited)
+USER_STORAGE_QUOTA_BYTES = int(os.getenv("USER_STORAGE_QUOTA_BYTES", str(5 * 1024 * 1024 * 1024)))  # Default 5 GB
+GLOBAL_STORAGE_QUOTA_BYTES = int(os.getenv("GLOBAL_STORAGE_QUOTA_BYTES", "0"))
 
 # Create uploads directory if it doesn't exist
 os.makedirs(UPLOAD_DIR, exist_ok=True) 
\ No newline at end of file
@@ -0,0 +1,91 @@
+import asyncio
+import datetime
+import logging
+from typing import Optional
+
+from ..core import config
+from .database import add_audit_events
+
+logger = logging.getLogger(__name__)
+
+class AuditLogger:
+    """Buffers audit events in memory and writes them in batches.
+
+    A batch is flushed when it reaches ``batch_size`` events or when its first
+    event is ``flush_interval`` seconds old, whichever comes first. The buffer
+    is bounded: once ``max_buffer`` events are waiting, ``record`` blocks until
+    the writer catches up.
+    """
+
+    def __init__(self, writer, batch_size: int, flush_interval: float, max_buffer: int):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_buffer)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still buffered and stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def record(self, action: str, user_id: str, file_id: str, **extra):
+        event = {
+            "action": action,
+            "user_id": user_id,
+            "file_id": file_id,
+            "timestamp": datetime.datetime.utcnow(),
+            **extra
+        }
+        if self._task is None:
+            # Writer not running (e.g. during startup); fall back to a direct write
+            await self._write([event])
+            return
+        await self._queue.put(event)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            event = await self._queue.get()
+            if event is None:
+                break
+            batch = [event]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    event = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+            await self._write(batch)
+
+    async def _write(self, batch):
+        try:
+            await self.writer(batch)
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit events: {str(e)}")
+
+audit_logger = AuditLogger(
+    add_audit_events,
+    batch_size=config.AUDIT_BATCH_SIZE,
+    flush_interval=config.AUDIT_FLUSH_INTERVAL_SECONDS,
+    max_buffer=config.AUDIT_MAX_BUFFER
+)
@@ -1,90 +1,66 @@
-import motor.motor_asyncio
-from typing import Optional, List, Dict, Any
 from ..core import config
 from ..models.user import UserType
-import datetime
-from bson import ObjectId
 from ..core.security import get_password_hash
+from .repository import MetadataRepository, GLOBAL_USAGE_ID
 
-# Create MongoDB client
-client = motor.motor_asyncio.AsyncIOMotorClient(config.MONGODB_URL)
-database = client[config.DATABASE_NAME]
-user_collection = database[config.COLLECTION_NAME]
-file_collection = database["files"]
+def create_repository(backend: str) -> MetadataRepository:
+    """Create the metadata repository selected by ``METADATA_BACKEND``.
 
-# User database operations
-async def add_user(user_data: dict) -> dict:
-    user = await user_collection.insert_one(user_data)
-    new_user = await user_collection.find_one({"_id": user.inserted_id})
-    return new_user
-
-async def find_user_by_email(email: str) -> Optional[dict]:
-    return await user_collection.find_one({"email": email})
-
-async def find_user_by_username(username: str) -> Optional[dict]:
-    return await user_collection.find_one({"username": username})
-
-async def find_user_by_id(user_id: str) -> Optional[dict]:
-    try:
-        return await user_collection.find_one({"_id": ObjectId(user_id)})
-    except:
-        return None
-
-async def update_user_verification(email: str, is_verified: bool) -> bool:
-    result = await user_collection.update_one(
-        {"email": email},
-        {"$set": {"is_verified": is_verified}}
-    )
-    return result.modified_count > 0
+    Backends are imported lazily so that, for example, a SQLite deployment
+    does not need Motor installed.
+    """
+    if backend == "mongo":
+        from .mongo import MongoRepository
+        return MongoRepository(config.MONGODB_URL, config.DATABASE_NAME, config.COLLECTION_NAME)
+    if backend == "sqlite":
+        from .sqlite import SQLiteRepository
+        return SQLiteRepository(config.SQLITE_PATH)
+    if backend == "memory":
+        from .memory import MemoryRepository
+        return MemoryRepository()
+    raise ValueError(f"Unknown metadata backend: {backend}")
 
-async def store_verification_token(email: str, token: str) -> bool:
-    result = await user_collection.update_one(
-        {"email": email},
-        {"$set": {"verification_token": token}}
-    )
-    return result.modified_count > 0
+repository = create_repository(config.METADATA_BACKEND)
 
-async def verify_token(email: str, token: str) -> bool:
-    user = await user_collection.find_one(
-        {"email": email, "verification_token": token}
-    )
-    if user:
-        await update_user_verification(email, True)
-        await user_collection.update_one(
-            {"email": email},
-            {"$unset": {"verification_token": ""}}
-        )
-        return True
-    return False
+# User database operations
+add_user = repository.add_user
+add_users_bulk = repository.add_users_bulk
+find_user_by_email = repository.find_user_by_email
+find_user_by_username = repository.find_user_by_username
+find_user_by_id = repository.find_user_by_id
+update_user_verification = repository.update_user_verification
+store_verification_token = repository.store_verification_token
+verify_token = repository.verify_token
+accept_invite = repository.accept_invite
 
 # File database operations
-async def add_file(file_data: dict) -> dict:
-    file_data["upload_date"] = datetime.datetime.now().isoformat()
-    file = await file_collection.insert_one(file_data)
-    new_file = await file_collection.find_one({"_id": file.inserted_id})
-    return new_file
+add_file = repository.add_file
+delete_file = repository.delete_file
+get_file_by_id = repository.get_file_by_id
+list_all_files = repository.list_all_files
+increment_file_stats = repository.increment_file_stats
+get_top_files = repository.get_top_files
 
-async def get_file_by_id(file_id: str) -> Optional[dict]:
-    try:
-        return await file_collection.find_one({"_id": ObjectId(file_id)})
-    except:
-        return None
+# File version operations
+add_file_version = repository.add_file_version
+chunk_file = repository.chunk_file
+list_file_versions = repository.list_file_versions
+get_file_version = repository.get_file_version
+list_referenced_chunks = repository.list_referenced_chunks
 
-async def list_all_files() -> List[dict]:
-    cursor = file_collection.find({})
-    files = await cursor.to_list(length=100)  # Limit to 100 files
-    return files
+# Storage usage operations
+get_storage_usage = repository.get_storage_usage
+reconcile_storage_usage = repository.reconcile_storage_usage
+
+# Audit log operations
+add_audit_events = repository.add_audit_events
+query_audit_events = repository.query_audit_events
 
 # Initialize database
 async def init_db():
     try:
-        # Create unique indexes for users
-        await user_collection.create_index("email", unique=True)
-        await user_collection.create_index("username", unique=True)
-        
-        # Create indexes for files
-        await file_collection.create_index("filename")
-        await file_collection.create_index("uploaded_by")
+        # Create tables/collections and indexes for the configured backend
+        await repository.init()
         
         print("Database initialized successfully!")
         
@@ -135,9 +111,12 @@ async def create_default_ops_users():
 # Test database connection
 async def test_connection():
     try:
-        await client.admin.command('ping')
-        print("Successfully connected to MongoDB!")
+        await repository.ping()
+        print(f"Successfully connected to the {config.METADATA_BACKEND} metadata store!")
         return True
     except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
-        return False 
\ No newline at end of file
+        print(f"Error connecting to the {config.METADATA_BACKEND} metadata store: {e}")
+        return False
+
+async def close_db():
+    await repository.close() 
\ No newline at end of file
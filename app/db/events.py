@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import re
+import secrets
+from collections import deque
+from typing import Optional, List, Tuple, Set
+
+import orjson
+
+from ..core import config
+from ..utils.serialization import file_to_dict
+from .database import repository
+from .repository import ChangeStreamSource
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+# Change stream resume tokens are hex strings whose order is the order of
+# the changes, so comparing them compares positions in the stream
+RESUME_TOKEN_PATTERN = re.compile(r"^[0-9A-Fa-f]+$")
+
+# A client catching up on its own change stream is reset if the shared
+# watcher has not covered its position by then
+CATCH_UP_TIMEOUT_SECONDS = 60.0
+
+def format_event(event_id: str, event_type: str, data: dict) -> bytes:
+    """Encode one server-sent event frame"""
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event_id.encode(), event_type.encode(), orjson.dumps(data)
+    )
+
+def format_reset(reason: str) -> bytes:
+    # No id: the client must re-list and reconnect without Last-Event-ID
+    return b"event: reset\ndata: %s\n\n" % orjson.dumps({"reason": reason})
+
+class Subscriber:
+    __slots__ = ("queue", "overflowed", "catch_up", "after")
+
+    def __init__(self, buffer_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+        # Set while the subscriber is fed by its own change stream
+        self.catch_up: Optional[asyncio.Task] = None
+        # Resume token the subscriber has already seen everything up to
+        self.after: Optional[str] = None
+
+class CatalogEvents:
+    """Fans out file catalog changes to server-sent event subscribers.
+
+    Each event is encoded once and the same bytes are queued for every
+    subscriber, so an idle subscriber costs one small bounded queue and no
+    timers: keepalives come from a single shared ticker. A subscriber whose
+    queue fills up is dropped and told to resync instead of slowing down
+    the publisher.
+
+    When the metadata store supports change streams, a single watcher task
+    per worker publishes every change, including ones made by other workers,
+    and the in-process ``file_*`` calls are ignored. Otherwise the endpoints'
+    ``file_*`` calls feed the bus directly, and subscribers on other workers
+    never see those events, so that mode needs a single worker.
+
+    The last ``history_size`` events are kept so a client can resume from
+    its last event id. With change streams the event id is the change's
+    resume token, so a client reconnecting to another worker or after a
+    restart resumes from the store. If the history does not reach back to
+    its token, the client first catches up on its own change stream and
+    joins the shared fan-out once it reaches a position the history covers.
+    Each of those streams ties up a Motor thread while it waits, so at most
+    ``max_catch_ups`` run at once and further clients get a ``reset``, as do
+    clients whose token the store no longer has. Without change streams ids
+    are ``<worker boot id>-<sequence>`` and an id from another worker, a
+    restart or beyond the history gets a ``reset``.
+    """
+
+    def __init__(
+        self,
+        history_size: int,
+        buffer_size: int,
+        keepalive_interval: float,
+        max_subscribers: int,
+        max_catch_ups: int
+    ):
+        self.boot_id = secrets.token_hex(4)
+        self.buffer_size = buffer_size
+        self.keepalive_interval = keepalive_interval
+        self.max_subscribers = max_subscribers
+        self.max_catch_ups = max_catch_ups
+        self.use_change_streams = False
+        self._seq = 0
+        self._history: deque = deque(maxlen=history_size)
+        # Resume token after which every change is in the history or still
+        # to be published by the shared watcher
+        self._covered_since: Optional[str] = None
+        self._subscribers: Set[Subscriber] = set()
+        self._catch_ups: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._tasks:
+            return
+        if isinstance(repository, ChangeStreamSource):
+            try:
+                self.use_change_streams = await repository.supports_change_streams()
+            except Exception as e:
+                logger.error(f"Could not check change stream support: {str(e)}")
+        self._tasks.append(asyncio.create_task(self._keepalive()))
+        if self.use_change_streams:
+            self._tasks.append(asyncio.create_task(self._watch()))
+        print(f"Catalog events source: {'change streams' if self.use_change_streams else 'in-process bus'}")
+        if not self.use_change_streams:
+            logger.warning(
+                "Catalog events only reach subscribers on the worker that made the change; "
+                "run a single worker or use MongoDB on a replica set for /files/events"
+            )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for subscriber in list(self._subscribers):
+            self._close(subscriber)
+
+    # Subscribers
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Optional[Subscriber], List[bytes]]:
+        """Register a subscriber and return it with the frames to replay first.
+
+        Returns ``(None, [])`` when the worker already has ``max_subscribers``.
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            return None, []
+        subscriber = Subscriber(self.buffer_size)
+        self._subscribers.add(subscriber)
+        replay = self._replay(subscriber, last_event_id)
+        if replay is None:
+            # Resume token from before this worker's history: catch up from
+            # the store itself, if there is room for another change stream
+            if len(self._catch_ups) >= self.max_catch_ups:
+                replay = [format_reset("too many clients catching up")]
+            else:
+                task = asyncio.create_task(self._catch_up(subscriber, last_event_id.upper()))
+                self._catch_ups.add(task)
+                task.add_done_callback(self._catch_ups.discard)
+                subscriber.catch_up = task
+                replay = []
+        return subscriber, replay
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if subscriber.catch_up is not None:
+            subscriber.catch_up.cancel()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _replay(self, subscriber: Subscriber, last_event_id: Optional[str]) -> Optional[List[bytes]]:
+        """Return the frames after ``last_event_id``, or None to catch up from the store first"""
+        if not last_event_id:
+            return []
+        if self.use_change_streams:
+            if not RESUME_TOKEN_PATTERN.match(last_event_id):
+                return [format_reset("unknown event id")]
+            return self._join(subscriber, last_event_id.upper())
+        boot_id, _, seq = last_event_id.partition("-")
+        if boot_id != self.boot_id or not seq.isdigit():
+            return [format_reset("unknown event id")]
+        seq = int(seq)
+        # History must still hold the event right after the client's last one
+        oldest = self._history[0][0] if self._history else self._seq + 1
+        if seq + 1 < oldest:
+            return [format_reset("event id too old")]
+        return [frame for event_seq, _, frame in self._history if event_seq > seq]
+
+    def _close(self, subscriber: Subscriber, reset_reason: Optional[str] = None):
+        self.unsubscribe(subscriber)
+        try:
+            if reset_reason:
+                subscriber.queue.put_nowait(format_reset(reset_reason))
+            subscriber.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            subscriber.overflowed = True
+
+    def _join(self, subscriber: Subscriber, position: str) -> Optional[List[bytes]]:
+        """Move a subscriber onto the shared fan-out right after ``position``.
+
+        Returns the frames to replay from the history, or None if the history
+        does not reach back to ``position``. A subscriber ahead of the shared
+        watcher skips published events until it passes ``position``.
+        """
+        if self._covered_since is None or position < self._covered_since:
+            return None
+        subscriber.after = position
+        return [frame for _, event_id, frame in self._history if event_id > position]
+
+    def _offer(self, subscriber: Subscriber, frame: bytes) -> bool:
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Slow consumer: drop it rather than buffer without bound
+            self._subscribers.discard(subscriber)
+            subscriber.overflowed = True
+            return False
+        return True
+
+    async def _catch_up(self, subscriber: Subscriber, resume_token: str):
+        """Feed one subscriber from its own change stream until it can join the shared one"""
+        deadline = asyncio.get_running_loop().time() + CATCH_UP_TIMEOUT_SECONDS
+        changes = repository.watch_files(resume_after={"_data": resume_token})
+        try:
+            async for change, token in changes:
+                if change is not None:
+                    event = self._change_event(change)
+                    if event is not None and not self._offer(subscriber, format_event(change["_id"]["_data"], *event)):
+                        return
+                if token is not None:
+                    # Nothing is awaited between the check and the switch, so
+                    # no shared event can slip in between
+                    replay = self._join(subscriber, token["_data"])
+                    if replay is not None:
+                        subscriber.catch_up = None
+                        for frame in replay:
+                            if not self._offer(subscriber, frame):
+                                return
+                        return
+                if asyncio.get_running_loop().time() > deadline:
+                    subscriber.catch_up = None
+                    self._close(subscriber, "catch-up timed out")
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Typically a token the store no longer has in its oplog
+            logger.error(f"Could not resume change stream for subscriber: {str(e)}")
+            subscriber.catch_up = None
+            self._close(subscriber, "event id not resumable")
+        finally:
+            await changes.aclose()
+
+    # Publishing
+    def publish(self, event_type: str, data: dict, event_id: Optional[str] = None):
+        self._seq += 1
+        if event_id is None:
+            event_id = f"{self.boot_id}-{self._seq}"
+        frame = format_event(event_id, event_type, data)
+        if len(self._history) == self._history.maxlen:
+            # Everything after the event about to drop out is still held
+            self._covered_since = self._history[0][1]
+        self._history.append((self._seq, event_id, frame))
+        for subscriber in list(self._subscribers):
+            if subscriber.catch_up is not None:
+                continue
+            if subscriber.after is not None:
+                if event_id <= subscriber.after:
+                    continue
+                subscriber.after = None
+            self._offer(subscriber, frame)
+
+    def file_uploaded(self, file: dict):
+        if not self.use_change_streams:
+            self.publish("file.uploaded", file_to_dict(file))
+
+    def file_updated(self, file: dict):
+        if not self.use_change_streams:
+            self.publish("file.updated", file_to_dict(file))
+
+    def file_deleted(self, file_id: str):
+        if not self.use_change_streams:
+            self.publish("file.deleted", {"id": file_id})
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            for subscriber in list(self._subscribers):
+                try:
+                    subscriber.queue.put_nowait(KEEPALIVE_FRAME)
+                except asyncio.QueueFull:
+                    pass
+
+    async def _watch(self):
+        resume_token = None
+        while True:
+            try:
+                async for change, token in repository.watch_files(resume_after=resume_token):
+                    if self._covered_since is None:
+                        # The history is complete from the first position
+                        # this stream reports
+                        if change is not None:
+                            self._covered_since = change["_id"]["_data"]
+                        elif token is not None:
+                            self._covered_since = token["_data"]
+                    if token is not None:
+                        resume_token = token
+                    if change is None:
+                        continue
+                    event = self._change_event(change)
+                    if event is not None:
+                        self.publish(*event, event_id=change["_id"]["_data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if resume_token is not None and not repository.is_resumable_error(e):
+                    # The token is useless now; start over from the current
+                    # position and tell every subscriber it missed events
+                    logger.error(f"File change stream cannot resume, restarting: {str(e)}")
+                    resume_token = None
+                    self._restart()
+                else:
+                    logger.error(f"File change stream failed, retrying: {str(e)}")
+                await asyncio.sleep(config.EVENTS_RETRY_SECONDS)
+
+    def _restart(self):
+        self._history.clear()
+        self._covered_since = None
+        for subscriber in list(self._subscribers):
+            self._close(subscriber, "event stream restarted")
+
+    @staticmethod
+    def _change_event(change: dict) -> Optional[Tuple[str, dict]]:
+        operation = change["operationType"]
+        if operation == "delete":
+            return "file.deleted", {"id": str(change["documentKey"]["_id"])}
+        file = change.get("fullDocument")
+        if file is None:
+            # Updated and then deleted before the lookup; the delete follows
+            return None
+        return ("file.uploaded" if operation == "insert" else "file.updated"), file_to_dict(file)
+
+catalog_events = CatalogEvents(
+    history_size=config.EVENTS_HISTORY_SIZE,
+    buffer_size=config.EVENTS_SUBSCRIBER_BUFFER,
+    keepalive_interval=config.EVENTS_KEEPALIVE_SECONDS,
+    max_subscribers=config.EVENTS_MAX_SUBSCRIBERS,
+    max_catch_ups=config.EVENTS_MAX_CATCH_UPS
+)
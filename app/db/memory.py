@@ -0,0 +1,315 @@
+import copy
+import datetime
+import secrets
+from collections import deque
+from typing import Optional, List, Dict, Any, Set, Deque
+
+from ..core import config
+from .repository import MetadataRepository, DuplicateKeyError, GLOBAL_USAGE_ID, DUPLICATE_KEY_ERROR, to_naive_utc
+
+def new_id() -> str:
+    """Return a 24-character hex id, the same shape as a MongoDB ObjectId"""
+    return secrets.token_hex(12)
+
+class MemoryRepository(MetadataRepository):
+    """Metadata repository kept in process memory.
+
+    Intended for tests and throwaway single-process deployments; nothing is
+    persisted and every worker has its own copy. Documents are copied on the
+    way in and out so callers can mutate what they get back, as with Mongo.
+    """
+
+    def __init__(self):
+        self.users: Dict[str, dict] = {}
+        self.users_by_email: Dict[str, str] = {}
+        self.users_by_username: Dict[str, str] = {}
+        self.files: Dict[str, dict] = {}
+        self.usage: Dict[str, dict] = {}
+        self.versions: Dict[str, List[dict]] = {}
+        self.audit_events: Deque[dict] = deque()
+
+    async def ping(self) -> bool:
+        return True
+
+    async def init(self) -> None:
+        pass
+
+    # User database operations
+    def _insert_user(self, user_data: dict) -> dict:
+        for key, index in (("email", self.users_by_email), ("username", self.users_by_username)):
+            if user_data[key] in index:
+                raise DuplicateKeyError(f"Duplicate {key}: {user_data[key]}", key)
+        user = copy.deepcopy(user_data)
+        user.setdefault("_id", new_id())
+        self.users[user["_id"]] = user
+        self.users_by_email[user["email"]] = user["_id"]
+        self.users_by_username[user["username"]] = user["_id"]
+        user_data["_id"] = user["_id"]
+        return user
+
+    async def add_user(self, user_data: dict) -> dict:
+        return copy.deepcopy(self._insert_user(user_data))
+
+    async def add_users_bulk(self, users: List[dict]) -> List[dict]:
+        errors = []
+        for index, user_data in enumerate(users):
+            try:
+                self._insert_user(user_data)
+            except DuplicateKeyError as e:
+                key = e.args[1]
+                errors.append({
+                    "index": index,
+                    "code": DUPLICATE_KEY_ERROR,
+                    "keyValue": {key: user_data[key]},
+                    "errmsg": e.args[0]
+                })
+        return errors
+
+    def _get_user(self, index: Dict[str, str], value: str) -> Optional[dict]:
+        user_id = index.get(value)
+        return copy.deepcopy(self.users[user_id]) if user_id else None
+
+    async def find_user_by_email(self, email: str) -> Optional[dict]:
+        return self._get_user(self.users_by_email, email)
+
+    async def find_user_by_username(self, username: str) -> Optional[dict]:
+        return self._get_user(self.users_by_username, username)
+
+    async def find_user_by_id(self, user_id: str) -> Optional[dict]:
+        user = self.users.get(user_id)
+        return copy.deepcopy(user) if user else None
+
+    async def update_user_verification(self, email: str, is_verified: bool) -> bool:
+        user_id = self.users_by_email.get(email)
+        if not user_id or self.users[user_id].get("is_verified") == is_verified:
+            return False
+        self.users[user_id]["is_verified"] = is_verified
+        return True
+
+    async def store_verification_token(self, email: str, token: str) -> bool:
+        user_id = self.users_by_email.get(email)
+        if not user_id or self.users[user_id].get("verification_token") == token:
+            return False
+        self.users[user_id]["verification_token"] = token
+        return True
+
+    async def verify_token(self, email: str, token: str) -> bool:
+        user_id = self.users_by_email.get(email)
+        if not user_id or self.users[user_id].get("verification_token") != token:
+            return False
+        self.users[user_id]["is_verified"] = True
+        del self.users[user_id]["verification_token"]
+        return True
+
+    async def accept_invite(self, email: str, token: str, hashed_password: str) -> bool:
+        user_id = self.users_by_email.get(email)
+        if not user_id:
+            return False
+        user = self.users[user_id]
+        if user.get("verification_token") != token or user.get("hashed_password") != "":
+            return False
+        user["hashed_password"] = hashed_password
+        user["is_verified"] = True
+        del user["verification_token"]
+        return True
+
+    # File database operations
+    async def add_file(self, file_data: dict) -> dict:
+        chunks = file_data.pop("chunks", None)
+        chunk_sizes = file_data.pop("chunk_sizes", None)
+        file_data["upload_date"] = datetime.datetime.now().isoformat()
+        if chunks is not None:
+            file_data["version"] = 1
+        file = copy.deepcopy(file_data)
+        file["_id"] = new_id()
+        self.files[file["_id"]] = file
+        if chunks is not None:
+            self.versions[file["_id"]] = [{
+                "file_id": file["_id"],
+                "version": 1,
+                "filename": file["filename"],
+                "size": file["size"],
+                "stored_bytes": file["stored_bytes"],
+                "chunks": list(chunks),
+                "chunk_sizes": list(chunk_sizes),
+                "upload_date": file["upload_date"],
+                "uploaded_by": file["uploaded_by"]
+            }]
+        self._inc_storage_usage(file["uploaded_by"], file.get("stored_bytes", file["size"]), 1)
+        return copy.deepcopy(file)
+
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        file = self.files.pop(file_id, None)
+        if file:
+            self.versions.pop(file_id, None)
+            self._inc_storage_usage(file["uploaded_by"], -file.get("stored_bytes", file["size"]), -1)
+        return file
+
+    async def get_file_by_id(self, file_id: str) -> Optional[dict]:
+        file = self.files.get(file_id)
+        return copy.deepcopy(file) if file else None
+
+    async def list_all_files(self, limit: int = 100) -> List[dict]:
+        return [copy.deepcopy(file) for file in list(self.files.values())[:limit]]
+
+    async def increment_file_stats(self, counters: Dict[str, List[int]], last_downloaded: datetime.datetime) -> List[str]:
+        for file_id, (downloads, bytes_served) in counters.items():
+            file = self.files.get(file_id)
+            if not file:
+                continue
+            file["download_count"] = file.get("download_count", 0) + downloads
+            file["bytes_served"] = file.get("bytes_served", 0) + bytes_served
+            if file.get("last_downloaded") is None or file["last_downloaded"] < last_downloaded:
+                file["last_downloaded"] = last_downloaded
+        return []
+
+    async def get_top_files(self, limit: int) -> List[dict]:
+        ranked = sorted(
+            (file for file in self.files.values() if file.get("download_count", 0) > 0),
+            key=lambda file: file["download_count"],
+            reverse=True
+        )
+        return [copy.deepcopy(file) for file in ranked[:limit]]
+
+    # File version operations
+    async def add_file_version(self, file_id: str, version_data: dict) -> Optional[dict]:
+        file = self.files.get(file_id)
+        if not file or file.get("storage") != "chunks":
+            return None
+        upload_date = datetime.datetime.now().isoformat()
+        file["version"] += 1
+        file["stored_bytes"] += version_data["stored_bytes"]
+        file["filename"] = version_data["filename"]
+        file["size"] = version_data["size"]
+        file["modified_date"] = upload_date
+        self.versions[file_id].append({
+            "file_id": file_id,
+            "version": file["version"],
+            "filename": version_data["filename"],
+            "size": version_data["size"],
+            "stored_bytes": version_data["stored_bytes"],
+            "chunks": list(version_data["chunks"]),
+            "chunk_sizes": list(version_data["chunk_sizes"]),
+            "upload_date": upload_date,
+            "uploaded_by": version_data["uploaded_by"]
+        })
+        self._inc_storage_usage(file["uploaded_by"], version_data["stored_bytes"], 0)
+        return copy.deepcopy(file)
+
+    async def chunk_file(self, file_id: str, version_data: dict) -> Optional[dict]:
+        file = self.files.get(file_id)
+        if not file or file.get("storage") == "chunks":
+            return None
+        file["storage"] = "chunks"
+        file["version"] = 1
+        file["stored_bytes"] = version_data["stored_bytes"]
+        file.pop("stored_filename", None)
+        file.pop("file_path", None)
+        self.versions[file_id] = [{
+            "file_id": file_id,
+            "version": 1,
+            "filename": file["filename"],
+            "size": file["size"],
+            "stored_bytes": version_data["stored_bytes"],
+            "chunks": list(version_data["chunks"]),
+            "chunk_sizes": list(version_data["chunk_sizes"]),
+            "upload_date": file["upload_date"],
+            "uploaded_by": file["uploaded_by"]
+        }]
+        self._inc_storage_usage(file["uploaded_by"], version_data["stored_bytes"] - file["size"], 0)
+        return copy.deepcopy(file)
+
+    async def list_file_versions(self, file_id: str) -> List[dict]:
+        return [
+            {key: value for key, value in version.items() if key not in ("chunks", "chunk_sizes")}
+            for version in self.versions.get(file_id, [])
+        ]
+
+    async def get_file_version(self, file_id: str, version: int) -> Optional[dict]:
+        for record in self.versions.get(file_id, []):
+            if record["version"] == version:
+                return copy.deepcopy(record)
+        return None
+
+    async def list_referenced_chunks(self, file_id: Optional[str] = None) -> Set[str]:
+        if file_id:
+            version_lists = [self.versions.get(file_id, [])]
+        else:
+            version_lists = self.versions.values()
+        return {
+            digest
+            for versions in version_lists
+            for version in versions
+            for digest in version["chunks"]
+        }
+
+    # Storage usage operations
+    def _inc_storage_usage(self, user_id: str, bytes_delta: int, files_delta: int) -> None:
+        for usage_id in (user_id, GLOBAL_USAGE_ID):
+            usage = self.usage.setdefault(usage_id, {"_id": usage_id, "bytes": 0, "files": 0})
+            usage["bytes"] += bytes_delta
+            usage["files"] += files_delta
+
+    async def get_storage_usage(self, user_id: str) -> Dict[str, dict]:
+        return {
+            usage_id: dict(self.usage[usage_id])
+            for usage_id in (user_id, GLOBAL_USAGE_ID) if usage_id in self.usage
+        }
+
+    async def reconcile_storage_usage(self) -> Dict[str, Any]:
+        totals: Dict[str, List[int]] = {}
+        for file in self.files.values():
+            total = totals.setdefault(file["uploaded_by"], [0, 0])
+            total[0] += file.get("stored_bytes", file["size"])
+            total[1] += 1
+
+        for usage_id, usage in self.usage.items():
+            if usage_id != GLOBAL_USAGE_ID and usage_id not in totals:
+                usage["bytes"] = usage["files"] = 0
+        for user_id, (total_bytes, total_files) in totals.items():
+            usage = self.usage.setdefault(user_id, {"_id": user_id})
+            usage["bytes"], usage["files"] = total_bytes, total_files
+
+        total_bytes = sum(total[0] for total in totals.values())
+        total_files = sum(total[1] for total in totals.values())
+        usage = self.usage.setdefault(GLOBAL_USAGE_ID, {"_id": GLOBAL_USAGE_ID})
+        usage["bytes"], usage["files"] = total_bytes, total_files
+        return {"users": len(totals), "bytes": total_bytes, "files": total_files, "skipped": 0}
+
+    # Audit log operations
+    async def add_audit_events(self, events: List[dict]) -> None:
+        self.audit_events.extend(copy.deepcopy(events))
+        # Stands in for Mongo's TTL index; events are in time order, so the
+        # expired ones are all at the front
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=config.AUDIT_RETENTION_DAYS)
+        while self.audit_events and self.audit_events[0]["timestamp"] < cutoff:
+            self.audit_events.popleft()
+
+    async def query_audit_events(
+        self,
+        user_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        since = to_naive_utc(since) if since else None
+        until = to_naive_utc(until) if until else None
+        results = []
+        # Events are appended in time order, so walk backwards for newest first
+        for event in reversed(self.audit_events):
+            if user_id and event["user_id"] != user_id:
+                continue
+            if file_id and event["file_id"] != file_id:
+                continue
+            if action and event["action"] != action:
+                continue
+            if since and event["timestamp"] < since:
+                continue
+            if until and event["timestamp"] >= until:
+                continue
+            results.append(copy.deepcopy(event))
+            if len(results) >= limit:
+                break
+        return results
@@ -0,0 +1,433 @@
+import motor.motor_asyncio
+from typing import Optional, List, Dict, Any, Set
+import datetime
+from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure, ConnectionFailure
+
+from ..core import config
+from .repository import MetadataRepository, ChangeStreamSource, GLOBAL_USAGE_ID
+
+# Download counter flushes touch download_count on every update; they are
+# not catalog changes, so keep them out of the change stream
+FILE_CHANGES_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$in": ["insert", "delete", "replace"]}},
+        {
+            "operationType": "update",
+            "updateDescription.updatedFields.download_count": {"$exists": False}
+        }
+    ]}}
+]
+
+# Server error code for an index that exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
+# Only the fields a file listing needs; skips paths and other internals
+FILE_LIST_PROJECTION = {
+    "filename": 1,
+    "file_type": 1,
+    "size": 1,
+    "upload_date": 1,
+    "download_count": 1,
+    "bytes_served": 1,
+    "version": 1
+}
+
+class MongoRepository(MetadataRepository, ChangeStreamSource):
+    """Metadata repository backed by MongoDB through Motor"""
+
+    def __init__(self, url: str, database_name: str, user_collection_name: str):
+        self.client = motor.motor_asyncio.AsyncIOMotorClient(url)
+        self.database = self.client[database_name]
+        self.user_collection = self.database[user_collection_name]
+        self.file_collection = self.database["files"]
+        self.audit_collection = self.database["audit_log"]
+        self.usage_collection = self.database["storage_usage"]
+        self.version_collection = self.database["file_versions"]
+
+    async def ping(self) -> bool:
+        await self.client.admin.command('ping')
+        return True
+
+    async def init(self) -> None:
+        # Create unique indexes for users
+        await self.user_collection.create_index("email", unique=True)
+        await self.user_collection.create_index("username", unique=True)
+
+        # Create indexes for files
+        await self.file_collection.create_index("filename")
+        await self.file_collection.create_index("uploaded_by")
+        await self.file_collection.create_index([("download_count", -1)])
+        await self.version_collection.create_index([("file_id", 1), ("version", 1)], unique=True)
+
+        # Create indexes for the audit log; old events expire via the TTL index
+        await self._ensure_audit_ttl(config.AUDIT_RETENTION_DAYS * 24 * 60 * 60)
+        await self.audit_collection.create_index([("user_id", 1), ("timestamp", -1)])
+        await self.audit_collection.create_index([("file_id", 1), ("timestamp", -1)])
+
+    async def _ensure_audit_ttl(self, expire_after_seconds: int) -> None:
+        try:
+            await self.audit_collection.create_index("timestamp", expireAfterSeconds=expire_after_seconds)
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # AUDIT_RETENTION_DAYS changed since the index was built; update
+            # the TTL in place instead of rebuilding the index
+            await self.database.command(
+                "collMod",
+                self.audit_collection.name,
+                index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": expire_after_seconds}
+            )
+
+    async def close(self) -> None:
+        self.client.close()
+
+    async def supports_change_streams(self) -> bool:
+        # Change streams need a replica set or a sharded cluster
+        hello = await self.client.admin.command("hello")
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def watch_files(self, resume_after: Optional[Any] = None):
+        async with self.file_collection.watch(
+            FILE_CHANGES_PIPELINE,
+            full_document="updateLookup",
+            resume_after=resume_after
+        ) as stream:
+            # try_next instead of iterating, so idle getMores still report
+            # the stream's position
+            while stream.alive:
+                change = await stream.try_next()
+                yield change, stream.resume_token
+
+    def is_resumable_error(self, error: Exception) -> bool:
+        # Motor resumes after transient errors itself; what reaches the
+        # caller is either the server staying unreachable, where the token
+        # is still good once it is back, or something like
+        # ChangeStreamHistoryLost, which no retry with the same token fixes
+        return isinstance(error, ConnectionFailure)
+
+    # User database operations
+    async def add_user(self, user_data: dict) -> dict:
+        user = await self.user_collection.insert_one(user_data)
+        new_user = await self.user_collection.find_one({"_id": user.inserted_id})
+        return new_user
+
+    async def add_users_bulk(self, users: List[dict]) -> List[dict]:
+        if not users:
+            return []
+        try:
+            await self.user_collection.insert_many(users, ordered=False)
+        except BulkWriteError as e:
+            return e.details.get("writeErrors", [])
+        return []
+
+    async def find_user_by_email(self, email: str) -> Optional[dict]:
+        return await self.user_collection.find_one({"email": email})
+
+    async def find_user_by_username(self, username: str) -> Optional[dict]:
+        return await self.user_collection.find_one({"username": username})
+
+    async def find_user_by_id(self, user_id: str) -> Optional[dict]:
+        try:
+            return await self.user_collection.find_one({"_id": ObjectId(user_id)})
+        except:
+            return None
+
+    async def update_user_verification(self, email: str, is_verified: bool) -> bool:
+        result = await self.user_collection.update_one(
+            {"email": email},
+            {"$set": {"is_verified": is_verified}}
+        )
+        return result.modified_count > 0
+
+    async def store_verification_token(self, email: str, token: str) -> bool:
+        result = await self.user_collection.update_one(
+            {"email": email},
+            {"$set": {"verification_token": token}}
+        )
+        return result.modified_count > 0
+
+    async def verify_token(self, email: str, token: str) -> bool:
+        user = await self.user_collection.find_one(
+            {"email": email, "verification_token": token}
+        )
+        if user:
+            await self.update_user_verification(email, True)
+            await self.user_collection.update_one(
+                {"email": email},
+                {"$unset": {"verification_token": ""}}
+            )
+            return True
+        return False
+
+    async def accept_invite(self, email: str, token: str, hashed_password: str) -> bool:
+        result = await self.user_collection.update_one(
+            {"email": email, "verification_token": token, "hashed_password": ""},
+            {
+                "$set": {"hashed_password": hashed_password, "is_verified": True},
+                "$unset": {"verification_token": ""}
+            }
+        )
+        return result.modified_count > 0
+
+    # File database operations
+    async def add_file(self, file_data: dict) -> dict:
+        chunks = file_data.pop("chunks", None)
+        chunk_sizes = file_data.pop("chunk_sizes", None)
+        file_data["upload_date"] = datetime.datetime.now().isoformat()
+        if chunks is not None:
+            file_data["version"] = 1
+        file = await self.file_collection.insert_one(file_data)
+        if chunks is not None:
+            await self.version_collection.insert_one({
+                "file_id": str(file.inserted_id),
+                "version": 1,
+                "filename": file_data["filename"],
+                "size": file_data["size"],
+                "stored_bytes": file_data["stored_bytes"],
+                "chunks": chunks,
+                "chunk_sizes": chunk_sizes,
+                "upload_date": file_data["upload_date"],
+                "uploaded_by": file_data["uploaded_by"]
+            })
+        await self._inc_storage_usage(file_data["uploaded_by"], file_data.get("stored_bytes", file_data["size"]), 1)
+        new_file = await self.file_collection.find_one({"_id": file.inserted_id})
+        return new_file
+
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        try:
+            file = await self.file_collection.find_one_and_delete({"_id": ObjectId(file_id)})
+        except:
+            return None
+        if file:
+            await self.version_collection.delete_many({"file_id": file_id})
+            await self._inc_storage_usage(file["uploaded_by"], -file.get("stored_bytes", file["size"]), -1)
+        return file
+
+    async def get_file_by_id(self, file_id: str) -> Optional[dict]:
+        try:
+            return await self.file_collection.find_one({"_id": ObjectId(file_id)})
+        except:
+            return None
+
+    async def list_all_files(self, limit: int = 100) -> List[dict]:
+        cursor = self.file_collection.find({}, FILE_LIST_PROJECTION, batch_size=min(limit, 10000))
+        files = await cursor.to_list(length=limit)
+        return files
+
+    async def increment_file_stats(self, counters: Dict[str, List[int]], last_downloaded: datetime.datetime) -> List[str]:
+        operations = []
+        file_ids = []
+        for file_id, (downloads, bytes_served) in counters.items():
+            try:
+                object_id = ObjectId(file_id)
+            except Exception:
+                continue
+            operations.append(UpdateOne(
+                {"_id": object_id},
+                {
+                    "$inc": {"download_count": downloads, "bytes_served": bytes_served},
+                    "$max": {"last_downloaded": last_downloaded}
+                }
+            ))
+            file_ids.append(file_id)
+        if not operations:
+            return []
+        try:
+            await self.file_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: every operation not listed here was applied
+            return [file_ids[error["index"]] for error in e.details.get("writeErrors", [])]
+        return []
+
+    async def get_top_files(self, limit: int) -> List[dict]:
+        cursor = self.file_collection.find({"download_count": {"$gt": 0}}).sort("download_count", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    # File version operations
+    async def add_file_version(self, file_id: str, version_data: dict) -> Optional[dict]:
+        upload_date = datetime.datetime.now().isoformat()
+        try:
+            object_id = ObjectId(file_id)
+        except Exception:
+            return None
+        # Claim the next version number atomically on the file document
+        file = await self.file_collection.find_one_and_update(
+            {"_id": object_id, "storage": "chunks"},
+            {
+                "$inc": {"version": 1, "stored_bytes": version_data["stored_bytes"]},
+                "$set": {
+                    "filename": version_data["filename"],
+                    "size": version_data["size"],
+                    "modified_date": upload_date
+                }
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if not file:
+            return None
+        await self.version_collection.insert_one({
+            "file_id": file_id,
+            "version": file["version"],
+            "filename": version_data["filename"],
+            "size": version_data["size"],
+            "stored_bytes": version_data["stored_bytes"],
+            "chunks": version_data["chunks"],
+            "chunk_sizes": version_data["chunk_sizes"],
+            "upload_date": upload_date,
+            "uploaded_by": version_data["uploaded_by"]
+        })
+        await self._inc_storage_usage(file["uploaded_by"], version_data["stored_bytes"], 0)
+        return file
+
+    async def chunk_file(self, file_id: str, version_data: dict) -> Optional[dict]:
+        try:
+            object_id = ObjectId(file_id)
+        except Exception:
+            return None
+        # The storage filter makes a concurrent conversion of the same file a no-op
+        file = await self.file_collection.find_one_and_update(
+            {"_id": object_id, "storage": {"$ne": "chunks"}},
+            {
+                "$set": {"storage": "chunks", "version": 1, "stored_bytes": version_data["stored_bytes"]},
+                "$unset": {"stored_filename": "", "file_path": ""}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if not file:
+            return None
+        await self.version_collection.insert_one({
+            "file_id": file_id,
+            "version": 1,
+            "filename": file["filename"],
+            "size": file["size"],
+            "stored_bytes": version_data["stored_bytes"],
+            "chunks": version_data["chunks"],
+            "chunk_sizes": version_data["chunk_sizes"],
+            "upload_date": file["upload_date"],
+            "uploaded_by": file["uploaded_by"]
+        })
+        await self._inc_storage_usage(file["uploaded_by"], version_data["stored_bytes"] - file["size"], 0)
+        return file
+
+    async def list_file_versions(self, file_id: str) -> List[dict]:
+        cursor = self.version_collection.find(
+            {"file_id": file_id},
+            {"chunks": 0, "chunk_sizes": 0}
+        ).sort("version", 1)
+        return await cursor.to_list(length=None)
+
+    async def get_file_version(self, file_id: str, version: int) -> Optional[dict]:
+        return await self.version_collection.find_one({"file_id": file_id, "version": version})
+
+    async def list_referenced_chunks(self, file_id: Optional[str] = None) -> Set[str]:
+        pipeline = [
+            {"$match": {"file_id": file_id} if file_id else {}},
+            {"$project": {"chunks": 1}},
+            {"$unwind": "$chunks"},
+            {"$group": {"_id": "$chunks"}}
+        ]
+        referenced = set()
+        async for doc in self.version_collection.aggregate(pipeline, allowDiskUse=True):
+            referenced.add(doc["_id"])
+        return referenced
+
+    # Storage usage operations
+    async def _inc_storage_usage(self, user_id: str, bytes_delta: int, files_delta: int) -> None:
+        inc = {"$inc": {"bytes": bytes_delta, "files": files_delta}}
+        await self.usage_collection.bulk_write([
+            UpdateOne({"_id": user_id}, inc, upsert=True),
+            UpdateOne({"_id": GLOBAL_USAGE_ID}, inc, upsert=True)
+        ], ordered=False)
+
+    async def get_storage_usage(self, user_id: str) -> Dict[str, dict]:
+        cursor = self.usage_collection.find({"_id": {"$in": [user_id, GLOBAL_USAGE_ID]}})
+        return {doc["_id"]: doc for doc in await cursor.to_list(length=2)}
+
+    async def _read_usage_counters(self) -> Dict[str, tuple]:
+        return {
+            doc["_id"]: (doc.get("bytes", 0), doc.get("files", 0))
+            async for doc in self.usage_collection.find()
+        }
+
+    async def reconcile_storage_usage(self) -> Dict[str, Any]:
+        # Other workers keep $inc-ing the counters while the files are
+        # aggregated, so a plain $set would drop their updates. A counter is
+        # only corrected if it did not move during the aggregation, and the
+        # update only applies if it still holds the value read afterwards.
+        before = await self._read_usage_counters()
+        pipeline = [
+            {"$group": {
+                "_id": "$uploaded_by",
+                "bytes": {"$sum": {"$ifNull": ["$stored_bytes", "$size"]}},
+                "files": {"$sum": 1}
+            }}
+        ]
+        totals = {
+            doc["_id"]: (doc["bytes"], doc["files"])
+            for doc in await self.file_collection.aggregate(pipeline).to_list(length=None)
+        }
+        after = await self._read_usage_counters()
+
+        users = len(totals)
+        total_bytes = sum(total[0] for total in totals.values())
+        total_files = sum(total[1] for total in totals.values())
+        totals[GLOBAL_USAGE_ID] = (total_bytes, total_files)
+
+        operations = []
+        skipped = 0
+        # Users whose files are all gone keep a usage document; zero it out
+        for usage_id in set(totals) | set(after):
+            actual = totals.get(usage_id, (0, 0))
+            counted = after.get(usage_id)
+            if counted == actual:
+                continue
+            if before.get(usage_id) != counted:
+                skipped += 1
+                continue
+            if counted is None:
+                # Only create it; a concurrent first $inc may have just done so
+                operations.append(UpdateOne(
+                    {"_id": usage_id},
+                    {"$setOnInsert": {"bytes": actual[0], "files": actual[1]}},
+                    upsert=True
+                ))
+            else:
+                operations.append(UpdateOne(
+                    {"_id": usage_id, "bytes": counted[0], "files": counted[1]},
+                    {"$set": {"bytes": actual[0], "files": actual[1]}}
+                ))
+        if operations:
+            result = await self.usage_collection.bulk_write(operations, ordered=False)
+            skipped += len(operations) - result.matched_count - result.upserted_count
+        return {"users": users, "bytes": total_bytes, "files": total_files, "skipped": skipped}
+
+    # Audit log operations
+    async def add_audit_events(self, events: List[dict]) -> None:
+        await self.audit_collection.insert_many(events, ordered=False)
+
+    async def query_audit_events(
+        self,
+        user_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        query = {}
+        if user_id:
+            query["user_id"] = user_id
+        if file_id:
+            query["file_id"] = file_id
+        if action:
+            query["action"] = action
+        if since or until:
+            query["timestamp"] = {}
+            if since:
+                query["timestamp"]["$gte"] = since
+            if until:
+                query["timestamp"]["$lt"] = until
+        cursor = self.audit_collection.find(query).sort("timestamp", -1).limit(limit)
+        return await cursor.to_list(length=limit)
@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from typing import Optional, List, Dict, Any, AsyncIterator, Set, Tuple
+import datetime
+
+# Usage document that tracks storage across all users
+GLOBAL_USAGE_ID = "__global__"
+
+# Error code reported for unique index conflicts, matching MongoDB
+DUPLICATE_KEY_ERROR = 11000
+
+def to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """Convert an aware datetime to naive UTC, the form timestamps are stored in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+class DuplicateKeyError(Exception):
+    """Raised by non-Mongo backends when a unique field is already taken"""
+
+class ChangeStreamSource(ABC):
+    """Mixin for backends that can push file metadata changes themselves.
+
+    Backends without it rely on the in-process event bus.
+    """
+
+    @abstractmethod
+    async def supports_change_streams(self) -> bool:
+        """Return True if the deployment can serve ``watch_files``"""
+
+    @abstractmethod
+    def watch_files(self, resume_after: Optional[Any] = None) -> AsyncIterator[Tuple[Optional[dict], Any]]:
+        """Yield ``(change, resume_token)`` pairs for the file metadata.
+
+        ``change`` is a MongoDB-style change event, or None when the stream
+        has read everything the store has so far; ``resume_token`` is how far
+        the stream has read, so it keeps advancing while no files change.
+        ``resume_after`` is the ``_id`` of an earlier event or a
+        ``resume_token``; the stream then starts right after it, even if it
+        came from another process.
+        """
+
+    @abstractmethod
+    def is_resumable_error(self, error: Exception) -> bool:
+        """Return True if ``watch_files`` may resume after ``error`` from its last token.
+
+        False means the token is no longer usable, for example because the
+        store dropped the history it points into.
+        """
+
+class MetadataRepository(ABC):
+    """Storage interface for user, file, token and audit metadata.
+
+    Documents are plain dicts shaped like the MongoDB documents: every
+    document has an ``_id`` and the same field names, so endpoint code does
+    not care which backend is in use.
+    """
+
+    @abstractmethod
+    async def ping(self) -> bool:
+        """Return True if the backend is reachable"""
+
+    @abstractmethod
+    async def init(self) -> None:
+        """Create tables/collections and indexes"""
+
+    async def close(self) -> None:
+        pass
+
+    # Users
+    @abstractmethod
+    async def add_user(self, user_data: dict) -> dict:
+        ...
+
+    @abstractmethod
+    async def add_users_bulk(self, users: List[dict]) -> List[dict]:
+        """Insert many users, skipping failures.
+
+        Returns MongoDB-style write errors (``index``, ``code``, ``keyValue``,
+        ``errmsg``) for the users that could not be inserted.
+        """
+
+    @abstractmethod
+    async def find_user_by_email(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def find_user_by_username(self, username: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def find_user_by_id(self, user_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def update_user_verification(self, email: str, is_verified: bool) -> bool:
+        ...
+
+    # Verification tokens
+    @abstractmethod
+    async def store_verification_token(self, email: str, token: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def verify_token(self, email: str, token: str) -> bool:
+        """Mark the user verified and drop the token if it matches"""
+
+    @abstractmethod
+    async def accept_invite(self, email: str, token: str, hashed_password: str) -> bool:
+        """Set an invited user's password, verify them and drop the token if it matches.
+
+        Invited users are stored with an empty ``hashed_password``; users
+        that already have a password are left alone.
+        """
+
+    # Files
+    @abstractmethod
+    async def add_file(self, file_data: dict) -> dict:
+        """Store file metadata and add its stored bytes to the uploader's usage.
+
+        Chunked files carry ``chunks`` and ``chunk_sizes``; these are moved
+        out of the file document into its version 1 record.
+        """
+
+    @abstractmethod
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        """Remove file metadata and versions, and subtract the stored bytes from the owner's usage"""
+
+    @abstractmethod
+    async def get_file_by_id(self, file_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def list_all_files(self, limit: int = 100) -> List[dict]:
+        ...
+
+    @abstractmethod
+    async def increment_file_stats(self, counters: Dict[str, List[int]], last_downloaded: datetime.datetime) -> List[str]:
+        """Apply coalesced ``[downloads, bytes_served]`` counters per file id.
+
+        Returns the ids whose update failed while others were applied; if
+        the call raises, none of the counters were applied.
+        """
+
+    @abstractmethod
+    async def get_top_files(self, limit: int) -> List[dict]:
+        ...
+
+    # File versions
+    @abstractmethod
+    async def add_file_version(self, file_id: str, version_data: dict) -> Optional[dict]:
+        """Record a new current version of a chunked file.
+
+        ``version_data`` holds ``filename``, ``size``, ``stored_bytes`` (bytes
+        of chunks no earlier version of the file has), ``chunks``,
+        ``chunk_sizes`` and ``uploaded_by``. The stored bytes are charged to
+        the file's owner. Returns the updated file,
+        or None if there is no chunked file with that id.
+        """
+
+    @abstractmethod
+    async def chunk_file(self, file_id: str, version_data: dict) -> Optional[dict]:
+        """Move a file stored whole into chunk storage as its version 1.
+
+        ``version_data`` holds ``stored_bytes``, ``chunks`` and
+        ``chunk_sizes`` for the file's current content; the owner's usage is
+        adjusted from the file size to the stored bytes. Clears the stored
+        path, which the caller removes. Returns the updated file, or None if
+        there is no file with that id still stored whole.
+        """
+
+    @abstractmethod
+    async def list_file_versions(self, file_id: str) -> List[dict]:
+        """Return the file's version records, oldest first, without chunk lists"""
+
+    @abstractmethod
+    async def get_file_version(self, file_id: str, version: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def list_referenced_chunks(self, file_id: Optional[str] = None) -> Set[str]:
+        """Return every chunk digest referenced by any version, or by the given file's versions"""
+
+    # Storage usage
+    @abstractmethod
+    async def get_storage_usage(self, user_id: str) -> Dict[str, dict]:
+        """Return the user's and the global usage documents keyed by ``_id``"""
+
+    @abstractmethod
+    async def reconcile_storage_usage(self) -> Dict[str, Any]:
+        """Recompute usage counters from file metadata to correct any drift.
+
+        Must not lose updates made concurrently by other workers; counters
+        that could not be corrected safely are counted in ``skipped``.
+        """
+
+    # Audit log
+    @abstractmethod
+    async def add_audit_events(self, events: List[dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def query_audit_events(
+        self,
+        user_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """Return matching events, newest first"""
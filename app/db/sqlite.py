@@ -0,0 +1,600 @@
+import asyncio
+import contextlib
+import datetime
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Set
+
+from ..core import config
+from .memory import new_id
+from .repository import MetadataRepository, DuplicateKeyError, GLOBAL_USAGE_ID, DUPLICATE_KEY_ERROR, to_naive_utc
+
+# SQLite has no TTL index; old audit events are deleted at most this often
+AUDIT_EXPIRY_INTERVAL_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    _id TEXT PRIMARY KEY,
+    username TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL UNIQUE,
+    hashed_password TEXT NOT NULL,
+    user_type TEXT NOT NULL,
+    is_verified INTEGER NOT NULL DEFAULT 0,
+    verification_token TEXT
+);
+
+CREATE TABLE IF NOT EXISTS files (
+    _id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    stored_filename TEXT,
+    file_path TEXT,
+    file_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    uploaded_by TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    storage TEXT,
+    version INTEGER,
+    stored_bytes INTEGER,
+    modified_date TEXT,
+    download_count INTEGER NOT NULL DEFAULT 0,
+    bytes_served INTEGER NOT NULL DEFAULT 0,
+    last_downloaded TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_filename ON files (filename);
+CREATE INDEX IF NOT EXISTS idx_files_uploaded_by ON files (uploaded_by);
+CREATE INDEX IF NOT EXISTS idx_files_download_count ON files (download_count DESC);
+
+CREATE TABLE IF NOT EXISTS file_versions (
+    file_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    chunks TEXT NOT NULL,
+    chunk_sizes TEXT NOT NULL,
+    upload_date TEXT NOT NULL,
+    uploaded_by TEXT NOT NULL,
+    PRIMARY KEY (file_id, version)
+);
+
+CREATE TABLE IF NOT EXISTS storage_usage (
+    _id TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    files INTEGER NOT NULL DEFAULT 0,
+    quota INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    action TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    file_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    ip_address TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_timestamp ON audit_log (timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_user ON audit_log (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_audit_file ON audit_log (file_id, timestamp);
+"""
+
+USER_COLUMNS = ("_id", "username", "email", "hashed_password", "user_type", "is_verified", "verification_token")
+FILE_COLUMNS = (
+    "_id", "filename", "stored_filename", "file_path", "file_type", "size", "uploaded_by", "upload_date",
+    "storage", "version", "stored_bytes"
+)
+VERSION_COLUMNS = (
+    "file_id", "version", "filename", "size", "stored_bytes", "chunks", "chunk_sizes", "upload_date", "uploaded_by"
+)
+# Columns a Mongo document would simply not have when they are unset
+OPTIONAL_FILE_COLUMNS = (
+    "stored_filename", "file_path", "storage", "version", "stored_bytes", "modified_date", "last_downloaded"
+)
+
+INSERT_USER = f"INSERT INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})"
+INSERT_FILE = f"INSERT INTO files ({', '.join(FILE_COLUMNS)}) VALUES ({', '.join('?' * len(FILE_COLUMNS))})"
+INSERT_VERSION = f"INSERT INTO file_versions ({', '.join(VERSION_COLUMNS)}) VALUES ({', '.join('?' * len(VERSION_COLUMNS))})"
+INC_USAGE = """
+INSERT INTO storage_usage (_id, bytes, files) VALUES (?, ?, ?)
+ON CONFLICT (_id) DO UPDATE SET bytes = bytes + excluded.bytes, files = files + excluded.files
+"""
+SET_USAGE = """
+INSERT INTO storage_usage (_id, bytes, files) VALUES (?, ?, ?)
+ON CONFLICT (_id) DO UPDATE SET bytes = excluded.bytes, files = excluded.files
+"""
+INC_FILE_STATS = """
+UPDATE files SET
+    download_count = download_count + ?,
+    bytes_served = bytes_served + ?,
+    last_downloaded = MAX(COALESCE(last_downloaded, ''), ?)
+WHERE _id = ?
+"""
+
+def _to_timestamp(value: datetime.datetime) -> str:
+    # Stored as naive UTC ISO strings so they sort and compare as text
+    return to_naive_utc(value).isoformat()
+
+def _user_from_row(row: sqlite3.Row) -> dict:
+    user = dict(row)
+    user["is_verified"] = bool(user["is_verified"])
+    if user["verification_token"] is None:
+        del user["verification_token"]
+    return user
+
+def _file_from_row(row: sqlite3.Row) -> dict:
+    file = dict(row)
+    for column in OPTIONAL_FILE_COLUMNS:
+        if file[column] is None:
+            del file[column]
+    if "last_downloaded" in file:
+        file["last_downloaded"] = datetime.datetime.fromisoformat(file["last_downloaded"])
+    return file
+
+def _version_params(file_id: str, version: int, upload_date: str, data: dict) -> tuple:
+    return (
+        file_id,
+        version,
+        data["filename"],
+        data["size"],
+        data["stored_bytes"],
+        json.dumps(data["chunks"]),
+        json.dumps(data["chunk_sizes"]),
+        upload_date,
+        data["uploaded_by"]
+    )
+
+def _version_from_row(row: sqlite3.Row) -> dict:
+    version = dict(row)
+    for column in ("chunks", "chunk_sizes"):
+        if column in version:
+            version[column] = json.loads(version[column])
+    return version
+
+def _event_from_row(row: sqlite3.Row) -> dict:
+    event = dict(row)
+    event["timestamp"] = datetime.datetime.fromisoformat(event["timestamp"])
+    return event
+
+class SQLiteRepository(MetadataRepository):
+    """Metadata repository backed by a single SQLite database file.
+
+    Writes run on one dedicated writer thread that owns its connection,
+    which keeps the event loop free and serialises writes without extra
+    locking. Plain reads run on a small pool of reader threads, each with
+    its own read-only connection; in WAL mode these read the last committed
+    state while the writer works, so lookups do not queue behind writes.
+    Statements are parameterised constants, so sqlite3's statement cache
+    reuses the prepared statements.
+    """
+
+    def __init__(self, path: str, read_workers: int = config.SQLITE_READ_WORKERS):
+        self.path = path
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite", initializer=self._mark_writer)
+        # An in-memory database is private to its connection, so it cannot be
+        # shared with reader connections
+        self._read_executor = self._executor
+        if path != ":memory:" and read_workers > 0:
+            self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="sqlite-read")
+        self._connections: List[sqlite3.Connection] = []
+        self._next_audit_expiry = 0.0
+
+    def _mark_writer(self):
+        self._local.is_writer = True
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _read(self, fn, *args):
+        """Run a read outside any transaction on a reader thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            is_writer = getattr(self._local, "is_writer", False)
+            # Autocommit mode; transactions are opened explicitly by _transaction
+            conn = sqlite3.connect(
+                self.path,
+                check_same_thread=False,
+                cached_statements=256,
+                isolation_level=None
+            )
+            conn.row_factory = sqlite3.Row
+            if is_writer:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA foreign_keys=ON")
+            else:
+                conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+            self._connections.append(conn)
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def ping(self) -> bool:
+        def ping():
+            self._connect().execute("SELECT 1").fetchone()
+            return True
+        return await self._run(ping)
+
+    async def init(self) -> None:
+        def init():
+            conn = self._connect()
+            conn.executescript(SCHEMA)
+            self._expire_audit_events(conn)
+        await self._run(init)
+
+    async def close(self) -> None:
+        if self._read_executor is not self._executor:
+            self._read_executor.shutdown(wait=True)
+        def close():
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local.conn = None
+        await self._run(close)
+        self._executor.shutdown(wait=False)
+
+    # User database operations
+    @staticmethod
+    def _user_params(user_data: dict) -> tuple:
+        user_data.setdefault("_id", new_id())
+        return (
+            user_data["_id"],
+            user_data["username"],
+            user_data["email"],
+            user_data["hashed_password"],
+            user_data["user_type"],
+            int(user_data.get("is_verified", False)),
+            user_data.get("verification_token")
+        )
+
+    @staticmethod
+    def _duplicate_key(error: sqlite3.IntegrityError) -> Optional[str]:
+        # Message looks like "UNIQUE constraint failed: users.email"
+        message = str(error)
+        if "UNIQUE constraint failed" not in message:
+            return None
+        return message.rsplit(".", 1)[-1]
+
+    def _find_user(self, column: str, value: str) -> Optional[dict]:
+        row = self._connect().execute(f"SELECT * FROM users WHERE {column} = ?", (value,)).fetchone()
+        return _user_from_row(row) if row else None
+
+    async def add_user(self, user_data: dict) -> dict:
+        def add_user():
+            conn = self._connect()
+            try:
+                with self._transaction(conn):
+                    conn.execute(INSERT_USER, self._user_params(user_data))
+            except sqlite3.IntegrityError as e:
+                key = self._duplicate_key(e)
+                if key is None:
+                    raise
+                raise DuplicateKeyError(f"Duplicate {key}: {user_data.get(key)}", key)
+            return self._find_user("_id", user_data["_id"])
+        return await self._run(add_user)
+
+    async def add_users_bulk(self, users: List[dict]) -> List[dict]:
+        def add_users_bulk():
+            conn = self._connect()
+            errors = []
+            # One transaction for the whole batch; a savepoint per row lets
+            # duplicates fail individually like an unordered insert_many
+            with self._transaction(conn):
+                for index, user_data in enumerate(users):
+                    conn.execute("SAVEPOINT bulk_user")
+                    try:
+                        conn.execute(INSERT_USER, self._user_params(user_data))
+                    except sqlite3.IntegrityError as e:
+                        conn.execute("ROLLBACK TO bulk_user")
+                        key = self._duplicate_key(e)
+                        errors.append({
+                            "index": index,
+                            "code": DUPLICATE_KEY_ERROR if key else None,
+                            "keyValue": {key: user_data.get(key)} if key else {},
+                            "errmsg": str(e)
+                        })
+                    conn.execute("RELEASE bulk_user")
+            return errors
+        if not users:
+            return []
+        return await self._run(add_users_bulk)
+
+    async def find_user_by_email(self, email: str) -> Optional[dict]:
+        return await self._read(self._find_user, "email", email)
+
+    async def find_user_by_username(self, username: str) -> Optional[dict]:
+        return await self._read(self._find_user, "username", username)
+
+    async def find_user_by_id(self, user_id: str) -> Optional[dict]:
+        return await self._read(self._find_user, "_id", user_id)
+
+    def _update(self, sql: str, params: tuple) -> bool:
+        conn = self._connect()
+        with self._transaction(conn):
+            return conn.execute(sql, params).rowcount > 0
+
+    async def update_user_verification(self, email: str, is_verified: bool) -> bool:
+        return await self._run(
+            self._update,
+            "UPDATE users SET is_verified = ? WHERE email = ? AND is_verified != ?",
+            (int(is_verified), email, int(is_verified))
+        )
+
+    async def store_verification_token(self, email: str, token: str) -> bool:
+        return await self._run(
+            self._update,
+            "UPDATE users SET verification_token = ? WHERE email = ? AND verification_token IS NOT ?",
+            (token, email, token)
+        )
+
+    async def verify_token(self, email: str, token: str) -> bool:
+        return await self._run(
+            self._update,
+            "UPDATE users SET is_verified = 1, verification_token = NULL WHERE email = ? AND verification_token = ?",
+            (email, token)
+        )
+
+    async def accept_invite(self, email: str, token: str, hashed_password: str) -> bool:
+        return await self._run(
+            self._update,
+            "UPDATE users SET hashed_password = ?, is_verified = 1, verification_token = NULL "
+            "WHERE email = ? AND verification_token = ? AND hashed_password = ''",
+            (hashed_password, email, token)
+        )
+
+    # File database operations
+    def _find_file(self, file_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT * FROM files WHERE _id = ?", (file_id,)).fetchone()
+        return _file_from_row(row) if row else None
+
+    def _inc_storage_usage(self, conn: sqlite3.Connection, user_id: str, bytes_delta: int, files_delta: int) -> None:
+        conn.executemany(INC_USAGE, [
+            (user_id, bytes_delta, files_delta),
+            (GLOBAL_USAGE_ID, bytes_delta, files_delta)
+        ])
+
+    async def add_file(self, file_data: dict) -> dict:
+        def add_file():
+            conn = self._connect()
+            chunks = file_data.pop("chunks", None)
+            chunk_sizes = file_data.pop("chunk_sizes", None)
+            file_data["upload_date"] = datetime.datetime.now().isoformat()
+            file_data["_id"] = new_id()
+            if chunks is not None:
+                file_data["version"] = 1
+            # File row, first version and usage counters commit together
+            with self._transaction(conn):
+                conn.execute(INSERT_FILE, tuple(file_data.get(column) for column in FILE_COLUMNS))
+                if chunks is not None:
+                    conn.execute(INSERT_VERSION, _version_params(
+                        file_data["_id"], 1, file_data["upload_date"],
+                        dict(file_data, chunks=chunks, chunk_sizes=chunk_sizes)
+                    ))
+                self._inc_storage_usage(
+                    conn, file_data["uploaded_by"], file_data.get("stored_bytes", file_data["size"]), 1
+                )
+            return self._find_file(file_data["_id"])
+        return await self._run(add_file)
+
+    async def delete_file(self, file_id: str) -> Optional[dict]:
+        def delete_file():
+            conn = self._connect()
+            with self._transaction(conn):
+                file = self._find_file(file_id)
+                if file is None:
+                    return None
+                conn.execute("DELETE FROM files WHERE _id = ?", (file_id,))
+                conn.execute("DELETE FROM file_versions WHERE file_id = ?", (file_id,))
+                self._inc_storage_usage(conn, file["uploaded_by"], -file.get("stored_bytes", file["size"]), -1)
+            return file
+        return await self._run(delete_file)
+
+    async def get_file_by_id(self, file_id: str) -> Optional[dict]:
+        return await self._read(self._find_file, file_id)
+
+    async def list_all_files(self, limit: int = 100) -> List[dict]:
+        def list_all_files():
+            rows = self._connect().execute("SELECT * FROM files LIMIT ?", (limit,)).fetchall()
+            return [_file_from_row(row) for row in rows]
+        return await self._read(list_all_files)
+
+    async def increment_file_stats(self, counters: Dict[str, List[int]], last_downloaded: datetime.datetime) -> List[str]:
+        def increment_file_stats():
+            conn = self._connect()
+            timestamp = _to_timestamp(last_downloaded)
+            with self._transaction(conn):
+                conn.executemany(INC_FILE_STATS, [
+                    (downloads, bytes_served, timestamp, file_id)
+                    for file_id, (downloads, bytes_served) in counters.items()
+                ])
+            # One transaction: either every counter was applied or it raised
+            return []
+        return await self._run(increment_file_stats)
+
+    async def get_top_files(self, limit: int) -> List[dict]:
+        def get_top_files():
+            rows = self._connect().execute(
+                "SELECT * FROM files WHERE download_count > 0 ORDER BY download_count DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+            return [_file_from_row(row) for row in rows]
+        return await self._read(get_top_files)
+
+    # File version operations
+    async def add_file_version(self, file_id: str, version_data: dict) -> Optional[dict]:
+        def add_file_version():
+            conn = self._connect()
+            upload_date = datetime.datetime.now().isoformat()
+            with self._transaction(conn):
+                updated = conn.execute(
+                    "UPDATE files SET version = version + 1, stored_bytes = stored_bytes + ?, "
+                    "filename = ?, size = ?, modified_date = ? WHERE _id = ? AND storage = 'chunks'",
+                    (version_data["stored_bytes"], version_data["filename"], version_data["size"], upload_date, file_id)
+                ).rowcount
+                if not updated:
+                    return None
+                file = self._find_file(file_id)
+                conn.execute(INSERT_VERSION, _version_params(file_id, file["version"], upload_date, version_data))
+                self._inc_storage_usage(conn, file["uploaded_by"], version_data["stored_bytes"], 0)
+            return file
+        return await self._run(add_file_version)
+
+    async def chunk_file(self, file_id: str, version_data: dict) -> Optional[dict]:
+        def chunk_file():
+            conn = self._connect()
+            with self._transaction(conn):
+                updated = conn.execute(
+                    "UPDATE files SET storage = 'chunks', version = 1, stored_bytes = ?, "
+                    "stored_filename = NULL, file_path = NULL "
+                    "WHERE _id = ? AND (storage IS NULL OR storage != 'chunks')",
+                    (version_data["stored_bytes"], file_id)
+                ).rowcount
+                if not updated:
+                    return None
+                file = self._find_file(file_id)
+                conn.execute(INSERT_VERSION, _version_params(file_id, 1, file["upload_date"], dict(
+                    version_data, filename=file["filename"], size=file["size"], uploaded_by=file["uploaded_by"]
+                )))
+                self._inc_storage_usage(conn, file["uploaded_by"], version_data["stored_bytes"] - file["size"], 0)
+            return file
+        return await self._run(chunk_file)
+
+    async def list_file_versions(self, file_id: str) -> List[dict]:
+        def list_file_versions():
+            columns = [column for column in VERSION_COLUMNS if column not in ("chunks", "chunk_sizes")]
+            rows = self._connect().execute(
+                f"SELECT {', '.join(columns)} FROM file_versions WHERE file_id = ? ORDER BY version",
+                (file_id,)
+            ).fetchall()
+            return [_version_from_row(row) for row in rows]
+        return await self._read(list_file_versions)
+
+    async def get_file_version(self, file_id: str, version: int) -> Optional[dict]:
+        def get_file_version():
+            row = self._connect().execute(
+                "SELECT * FROM file_versions WHERE file_id = ? AND version = ?",
+                (file_id, version)
+            ).fetchone()
+            return _version_from_row(row) if row else None
+        return await self._read(get_file_version)
+
+    async def list_referenced_chunks(self, file_id: Optional[str] = None) -> Set[str]:
+        def list_referenced_chunks():
+            referenced = set()
+            if file_id:
+                rows = self._connect().execute("SELECT chunks FROM file_versions WHERE file_id = ?", (file_id,))
+            else:
+                rows = self._connect().execute("SELECT chunks FROM file_versions")
+            for (chunks,) in rows:
+                referenced.update(json.loads(chunks))
+            return referenced
+        return await self._read(list_referenced_chunks)
+
+    # Storage usage operations
+    async def get_storage_usage(self, user_id: str) -> Dict[str, dict]:
+        def get_storage_usage():
+            rows = self._connect().execute(
+                "SELECT * FROM storage_usage WHERE _id IN (?, ?)",
+                (user_id, GLOBAL_USAGE_ID)
+            ).fetchall()
+            usage = {}
+            for row in rows:
+                doc = dict(row)
+                # Match Mongo, where the override field is simply absent
+                if doc["quota"] is None:
+                    del doc["quota"]
+                usage[doc["_id"]] = doc
+            return usage
+        return await self._read(get_storage_usage)
+
+    async def reconcile_storage_usage(self) -> Dict[str, Any]:
+        def reconcile_storage_usage():
+            conn = self._connect()
+            with self._transaction(conn):
+                totals = conn.execute(
+                    "SELECT uploaded_by, SUM(COALESCE(stored_bytes, size)), COUNT(*) FROM files GROUP BY uploaded_by"
+                ).fetchall()
+                total_bytes = sum(row[1] for row in totals)
+                total_files = sum(row[2] for row in totals)
+                conn.execute(
+                    "UPDATE storage_usage SET bytes = 0, files = 0 WHERE _id != ?",
+                    (GLOBAL_USAGE_ID,)
+                )
+                conn.executemany(SET_USAGE, [tuple(row) for row in totals])
+                conn.execute(SET_USAGE, (GLOBAL_USAGE_ID, total_bytes, total_files))
+            # One write transaction, so no concurrent update can be lost
+            return {"users": len(totals), "bytes": total_bytes, "files": total_files, "skipped": 0}
+        return await self._run(reconcile_storage_usage)
+
+    # Audit log operations
+    def _expire_audit_events(self, conn: sqlite3.Connection):
+        # Stands in for Mongo's TTL index; runs at startup and then from
+        # audit writes, at most once per AUDIT_EXPIRY_INTERVAL_SECONDS
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=config.AUDIT_RETENTION_DAYS)
+        with self._transaction(conn):
+            conn.execute("DELETE FROM audit_log WHERE timestamp < ?", (_to_timestamp(cutoff),))
+        self._next_audit_expiry = time.monotonic() + AUDIT_EXPIRY_INTERVAL_SECONDS
+
+    async def add_audit_events(self, events: List[dict]) -> None:
+        def add_audit_events():
+            conn = self._connect()
+            if time.monotonic() >= self._next_audit_expiry:
+                self._expire_audit_events(conn)
+            with self._transaction(conn):
+                conn.executemany(
+                    "INSERT INTO audit_log (action, user_id, file_id, timestamp, ip_address) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (event["action"], event["user_id"], event["file_id"],
+                         _to_timestamp(event["timestamp"]), event.get("ip_address"))
+                        for event in events
+                    ]
+                )
+        await self._run(add_audit_events)
+
+    async def query_audit_events(
+        self,
+        user_id: Optional[str] = None,
+        file_id: Optional[str] = None,
+        action: Optional[str] = None,
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        limit: int = 100
+    ) -> List[dict]:
+        def query_audit_events():
+            clauses = []
+            params = []
+            for column, value in (("user_id", user_id), ("file_id", file_id), ("action", action)):
+                if value:
+                    clauses.append(f"{column} = ?")
+                    params.append(value)
+            if since:
+                clauses.append("timestamp >= ?")
+                params.append(_to_timestamp(since))
+            if until:
+                clauses.append("timestamp < ?")
+                params.append(_to_timestamp(until))
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = self._connect().execute(
+                f"SELECT action, user_id, file_id, timestamp, ip_address FROM audit_log {where} "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+            return [_event_from_row(row) for row in rows]
+        return await self._read(query_audit_events)
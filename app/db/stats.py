@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from ..core import config
+from .database import increment_file_stats, get_top_files
+
+logger = logging.getLogger(__name__)
+
+class DownloadStats:
+    """Per-worker download counters flushed to MongoDB as bulk $inc updates.
+
+    ``record`` only touches an in-memory dict, so a download never waits on
+    the database. Every ``flush_interval`` seconds the counters are swapped
+    out, written with one bulk write, and the top files ranking is rebuilt
+    from the indexed ``download_count`` field. Counts are eventually
+    consistent across workers.
+    """
+
+    def __init__(self, flush_interval: float, ranking_size: int):
+        self.flush_interval = flush_interval
+        self.ranking_size = ranking_size
+        self._counters: Dict[str, List[int]] = {}
+        self._ranking: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        await self._refresh_ranking()
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush pending counters and stop the background task"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        await self.flush()
+
+    def record(self, file_id: str, size: int):
+        counter = self._counters.get(file_id)
+        if counter is None:
+            self._counters[file_id] = [1, size]
+        else:
+            counter[0] += 1
+            counter[1] += size
+
+    def top_files(self, limit: int) -> List[dict]:
+        return self._ranking[:limit]
+
+    async def flush(self):
+        if not self._counters:
+            return
+        counters, self._counters = self._counters, {}
+        try:
+            failed = await increment_file_stats(counters, datetime.datetime.utcnow())
+        except Exception as e:
+            logger.error(f"Failed to flush download stats: {str(e)}")
+            failed = list(counters)
+        else:
+            if failed:
+                logger.error(f"Failed to flush download stats for {len(failed)} files")
+        # Put back only the counts that were not applied, so they are retried
+        # on the next flush without double counting the rest
+        for file_id in failed:
+            downloads, bytes_served = counters[file_id]
+            counter = self._counters.setdefault(file_id, [0, 0])
+            counter[0] += downloads
+            counter[1] += bytes_served
+
+    async def _refresh_ranking(self):
+        try:
+            self._ranking = await get_top_files(self.ranking_size)
+        except Exception as e:
+            logger.error(f"Failed to refresh top files ranking: {str(e)}")
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            await self._refresh_ranking()
+
+download_stats = DownloadStats(
+    flush_interval=config.STATS_FLUSH_INTERVAL_SECONDS,
+    ranking_size=config.STATS_RANKING_SIZE
+)
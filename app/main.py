@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api.endpoints import auth, files
-from .db.database import init_db, test_connection
+from .db.database import init_db, test_connection, close_db
+from .db.audit import audit_logger
+from .db.stats import download_stats
+from .db.events import catalog_events
+from .utils.chunking import shutdown_chunk_workers
 
 app = FastAPI(title="Secure File Sharing API")
 
@@ -18,8 +22,20 @@ app.add_middleware(
 async def startup_db_client():
     if await test_connection():
         await init_db()
+        await audit_logger.start()
+        await download_stats.start()
+        await catalog_events.start()
     else:
-        raise Exception("Failed to connect to MongoDB. Make sure MongoDB is running.")
+        raise Exception("Failed to connect to the metadata store. Make sure MongoDB is running or set METADATA_BACKEND.")
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    # Flush buffered audit events before the process exits
+    await catalog_events.stop()
+    await audit_logger.stop()
+    await download_stats.stop()
+    await close_db()
+    shutdown_chunk_workers()
 
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
@@ -39,6 +55,7 @@ async def root():
             "files": {
                 "upload": "/files/upload",
                 "list": "/files/list",
+                "events": "/files/events",
                 "download": "/files/download/{file_id}"
             }
         }
@@ -13,6 +13,13 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+class BulkImportUser(UserBase):
+    # Without a password the user is invited and chooses one on acceptance
+    password: Optional[str] = None
+
+class InviteAcceptance(BaseModel):
+    password: str
+
 class UserInDB(UserBase):
     hashed_password: str
     user_type: UserType = UserType.CLIENT  # Default to CLIENT
@@ -28,6 +35,17 @@ class UserResponse(UserBase):
         from_attributes = True
         populate_by_name = True
 
+class BulkImportError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    detail: str
+
+class BulkImportResult(BaseModel):
+    total: int
+    created: int
+    failed: int
+    errors: List[BulkImportError] = []
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -53,7 +71,30 @@ class FileResponse(BaseModel):
     size: int
     upload_date: str
     download_url: Optional[str] = None
+    download_count: int = 0
+    bytes_served: int = 0
+    version: int = 1
 
     class Config:
         from_attributes = True
-        populate_by_name = True 
\ No newline at end of file
+        populate_by_name = True 
+
+class AuditEvent(BaseModel):
+    action: str
+    user_id: str
+    file_id: str
+    timestamp: str
+    ip_address: Optional[str] = None
+
+class StorageUsage(BaseModel):
+    bytes_used: int
+    files: int
+    quota_bytes: Optional[int] = None
+
+class FileVersion(BaseModel):
+    version: int
+    filename: str
+    size: int
+    stored_bytes: int
+    upload_date: str
+    uploaded_by: str
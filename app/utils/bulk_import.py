@@ -0,0 +1,62 @@
+import asyncio
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+from ..core import config
+from ..core.security import get_password_hash
+
+# bcrypt releases the GIL while hashing, so a thread pool scales with cores
+_hash_executor = ThreadPoolExecutor(
+    max_workers=config.BULK_IMPORT_HASH_WORKERS,
+    thread_name_prefix="bulk-hash"
+)
+
+def parse_user_rows(content: bytes, filename: str) -> List[Dict[str, Any]]:
+    """Parse a CSV or JSON user import file into a list of row dicts.
+
+    CSV files need a header row with ``username`` and ``email`` columns and
+    may have a ``password`` column. JSON files hold either a list of objects
+    or ``{"users": [...]}``.
+    Raises ValueError if the file cannot be parsed.
+    """
+    ext = filename.split(".")[-1].lower() if filename else ""
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("Import file must be UTF-8 encoded")
+
+    if ext == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise ValueError("CSV file is missing a header row")
+        missing = {"username", "email"} - {f.strip() for f in reader.fieldnames}
+        if missing:
+            raise ValueError(f"CSV file is missing columns: {', '.join(sorted(missing))}")
+        return [
+            {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+            for row in reader
+        ]
+
+    if ext == "json":
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {str(e)}")
+        if isinstance(data, dict):
+            data = data.get("users")
+        if not isinstance(data, list):
+            raise ValueError("JSON file must contain a list of users")
+        return [row if isinstance(row, dict) else {} for row in data]
+
+    raise ValueError("Import file must be a .csv or .json file")
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords concurrently on the bulk hashing thread pool"""
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*[
+        loop.run_in_executor(_hash_executor, get_password_hash, password)
+        for password in passwords
+    ])
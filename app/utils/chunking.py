@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from ..core import config
+
+# Gear hash table: one fixed pseudo-random 32-bit value per byte value. The
+# seed must never change, or identical content would stop producing
+# identical chunk boundaries.
+_rng = random.Random(0x5EC0F11E)
+GEAR = [_rng.getrandbits(32) for _ in range(256)]
+
+def _mask(avg_size: int) -> int:
+    # Use the high bits: with a left-shifting gear hash they mix the most bytes
+    bits = max(1, avg_size.bit_length() - 1)
+    return ((1 << bits) - 1) << (32 - bits)
+
+def find_cut_point(data, min_size: int, max_size: int, mask: int) -> int:
+    """Return the length of the next content-defined chunk at the start of ``data``.
+
+    Bytes before ``min_size`` are skipped, as in FastCDC, since a cut there is
+    never taken; the rolling gear hash then looks for a position whose high
+    bits are all zero, falling back to ``max_size``.
+    """
+    length = len(data)
+    if length <= min_size:
+        return length
+    end = min(length, max_size)
+    gear = GEAR
+    h = 0
+    for i in range(min_size, end):
+        h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+        if not h & mask:
+            return i + 1
+    return end
+
+def iter_chunks(
+    fileobj: BinaryIO,
+    min_size: int = config.CHUNK_MIN_SIZE,
+    avg_size: int = config.CHUNK_AVG_SIZE,
+    max_size: int = config.CHUNK_MAX_SIZE,
+    read_size: int = config.UPLOAD_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Split a file object into content-defined chunks.
+
+    Boundaries depend only on nearby content, so an edit only changes the
+    chunks around it and the rest of the file chunks exactly as before.
+    """
+    mask = _mask(avg_size)
+    buffer = bytearray()
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            block = fileobj.read(read_size)
+            if not block:
+                eof = True
+                break
+            buffer += block
+        if not buffer:
+            return
+        cut = find_cut_point(buffer, min_size, max_size, mask)
+        yield bytes(buffer[:cut])
+        del buffer[:cut]
+
+class ContentTooLarge(Exception):
+    """Raised when stored content exceeds the size or new-bytes limit"""
+
+class StoredContent:
+    __slots__ = ("chunks", "chunk_sizes", "size", "new_bytes")
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.chunk_sizes: List[int] = []
+        self.size = 0
+        self.new_bytes = 0
+
+class ChunkStore:
+    """Content-addressed chunk storage on the local filesystem.
+
+    Each chunk lives at ``<root>/<sha256[:2]>/<sha256>`` and is written at
+    most once, so versions that share content share chunks. Chunks are never
+    deleted when a file is; ``find_unreferenced`` and ``remove_chunks``
+    collect the unreferenced ones. Storing a chunk, new or reused, sets its
+    mtime, which is what the collection grace period is measured against.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def has_all(self, digests: List[str]) -> bool:
+        """Return True if every chunk is present; one stat per chunk, so call it off the event loop"""
+        return all(self.exists(digest) for digest in digests)
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """Store a chunk and return ``(digest, newly_written)``"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        try:
+            # Reused: refresh the mtime so garbage collection leaves it alone
+            # until the upload has recorded its version
+            os.utime(path)
+            return digest, False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a reader never sees a partial chunk
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with open(tmp_path, "wb") as buffer:
+            buffer.write(data)
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def store(
+        self,
+        fileobj: BinaryIO,
+        max_size: Optional[int],
+        max_new_bytes: Optional[int] = None,
+        known_chunks: FrozenSet[str] = frozenset()
+    ) -> StoredContent:
+        """Chunk a file object and store the chunks not already present.
+
+        ``new_bytes`` counts each distinct chunk not in ``known_chunks``,
+        the chunks of the file's earlier versions, whether or not another
+        file already stored it: quota is charged per file, so deleting one
+        file never leaves shared chunks uncounted. Raises ContentTooLarge
+        once more than ``max_size`` bytes are read or ``new_bytes`` passes
+        ``max_new_bytes``. Chunks written before that are left for garbage
+        collection.
+        """
+        content = StoredContent()
+        seen = set(known_chunks)
+        for data in iter_chunks(fileobj):
+            content.size += len(data)
+            if max_size is not None and content.size > max_size:
+                raise ContentTooLarge("File too large")
+            digest, _ = self.put(data)
+            if digest not in seen:
+                seen.add(digest)
+                content.new_bytes += len(data)
+                if max_new_bytes is not None and content.new_bytes > max_new_bytes:
+                    raise ContentTooLarge("Storage quota exceeded")
+            content.chunks.append(digest)
+            content.chunk_sizes.append(len(data))
+        return content
+
+    async def store_file(
+        self,
+        path: str,
+        max_size: Optional[int],
+        max_new_bytes: Optional[int] = None,
+        known_chunks: FrozenSet[str] = frozenset()
+    ) -> StoredContent:
+        """Run ``store`` on a file on disk in a chunking worker process.
+
+        The gear hash is a pure-Python loop over every byte, so it runs in
+        a separate process to keep it off this worker's GIL.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_chunk_pool(), _store_path, self.root, path, max_size, max_new_bytes, known_chunks
+        )
+
+    def iter_content(self, chunks: List[str]) -> Iterator[bytes]:
+        """Yield the bytes of a version, one chunk at a time"""
+        for digest in chunks:
+            with open(self.path(digest), "rb") as chunk:
+                yield chunk.read()
+
+    def find_unreferenced(self, referenced: Set[str], grace_seconds: float) -> List[str]:
+        """Return chunks not in ``referenced`` and untouched for ``grace_seconds``.
+
+        Leftover temporary files older than the grace period are removed.
+        """
+        unreferenced = []
+        cutoff = time.time() - grace_seconds
+        if not os.path.isdir(self.root):
+            return unreferenced
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name in referenced:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    if os.stat(path).st_mtime > cutoff:
+                        continue
+                    if "." in name:
+                        # Interrupted write or removal
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                unreferenced.append(name)
+        return unreferenced
+
+    def remove_chunks(self, digests: List[str], grace_seconds: float) -> Tuple[int, int]:
+        """Remove chunks unless stored again meanwhile; return ``(chunks, bytes)`` removed.
+
+        Each chunk is first renamed aside, so a concurrent ``put`` either
+        refreshed its mtime before the rename (the chunk is put back) or
+        finds it missing and writes it again.
+        """
+        removed = freed = 0
+        cutoff = time.time() - grace_seconds
+        for digest in digests:
+            path = self.path(digest)
+            doomed = f"{path}.{os.getpid()}.gc"
+            try:
+                os.rename(path, doomed)
+            except FileNotFoundError:
+                continue
+            stat = os.stat(doomed)
+            if stat.st_mtime > cutoff:
+                os.replace(doomed, path)
+                continue
+            os.remove(doomed)
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+_chunk_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_chunk_pool() -> ProcessPoolExecutor:
+    global _chunk_pool
+    if _chunk_pool is None:
+        # Spawn rather than fork: the server process has event loop and
+        # driver threads that must not be copied mid-operation
+        _chunk_pool = ProcessPoolExecutor(
+            max_workers=config.CHUNK_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _chunk_pool
+
+def shutdown_chunk_workers():
+    global _chunk_pool
+    if _chunk_pool is not None:
+        _chunk_pool.shutdown(wait=True)
+        _chunk_pool = None
+
+def _store_path(root: str, path: str, max_size: Optional[int], max_new_bytes: Optional[int], known_chunks: FrozenSet[str]) -> StoredContent:
+    # Runs in a chunking worker process
+    with open(path, "rb") as fileobj:
+        return ChunkStore(root).store(fileobj, max_size, max_new_bytes, known_chunks)
+
+chunk_store = ChunkStore(config.CHUNK_DIR)
@@ -1,3 +1,4 @@
+import asyncio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -5,9 +6,84 @@ from ..core import config
 import logging
 import traceback
 import os
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+def build_verification_message(email: str, verification_url: str) -> MIMEMultipart:
+    """Build the verification email for a single recipient"""
+    message = MIMEMultipart("alternative")
+    message["Subject"] = "Verify your email address"
+    message["From"] = config.MAIL_FROM
+    message["To"] = email
+    
+    # Email body in HTML
+    html_content = f"""
+    <html>
+    <body>
+        <h2>Welcome to the Secure File Sharing System!</h2>
+        <p>Please click the link below to verify your email address:</p>
+        <p><a href="{verification_url}">Verify Email</a></p>
+        <p>Or copy and paste this URL into your browser:</p>
+        <p>{verification_url}</p>
+        <p>This link will expire in 24 hours.</p>
+        <p>If you did not sign up for this service, please ignore this email.</p>
+    </body>
+    </html>
+    """
+    
+    # Plain text version
+    text_content = f"""
+    Welcome to the Secure File Sharing System!
+    
+    Please click the link below to verify your email address:
+    {verification_url}
+    
+    This link will expire in 24 hours.
+    
+    If you did not sign up for this service, please ignore this email.
+    """
+    
+    # Attach parts
+    part1 = MIMEText(text_content, "plain")
+    part2 = MIMEText(html_content, "html")
+    message.attach(part1)
+    message.attach(part2)
+    return message
+
+def build_invite_message(email: str, invite_url: str) -> MIMEMultipart:
+    """Build the invitation email for a user imported without a password"""
+    message = MIMEMultipart("alternative")
+    message["Subject"] = "You have been invited to the Secure File Sharing System"
+    message["From"] = config.MAIL_FROM
+    message["To"] = email
+    
+    html_content = f"""
+    <html>
+    <body>
+        <h2>You have been invited to the Secure File Sharing System!</h2>
+        <p>An account was created for you. Please click the link below to choose a password:</p>
+        <p><a href="{invite_url}">Accept Invitation</a></p>
+        <p>Or copy and paste this URL into your browser:</p>
+        <p>{invite_url}</p>
+        <p>If you were not expecting this invitation, please ignore this email.</p>
+    </body>
+    </html>
+    """
+    
+    text_content = f"""
+    You have been invited to the Secure File Sharing System!
+    
+    An account was created for you. Please open the link below to choose a password:
+    {invite_url}
+    
+    If you were not expecting this invitation, please ignore this email.
+    """
+    
+    message.attach(MIMEText(text_content, "plain"))
+    message.attach(MIMEText(html_content, "html"))
+    return message
+
 async def send_verification_email(email: str, token: str):
     """Send verification email using SMTP"""
     try:
@@ -21,43 +97,7 @@ async def send_verification_email(email: str, token: str):
         print(f"=== END DEVELOPMENT INFO ===\n")
         
         # Create email message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "Verify your email address"
-        message["From"] = config.MAIL_FROM
-        message["To"] = email
-        
-        # Email body in HTML
-        html_content = f"""
-        <html>
-        <body>
-            <h2>Welcome to the Secure File Sharing System!</h2>
-            <p>Please click the link below to verify your email address:</p>
-            <p><a href="{verification_url}">Verify Email</a></p>
-            <p>Or copy and paste this URL into your browser:</p>
-            <p>{verification_url}</p>
-            <p>This link will expire in 24 hours.</p>
-            <p>If you did not sign up for this service, please ignore this email.</p>
-        </body>
-        </html>
-        """
-        
-        # Plain text version
-        text_content = f"""
-        Welcome to the Secure File Sharing System!
-        
-        Please click the link below to verify your email address:
-        {verification_url}
-        
-        This link will expire in 24 hours.
-        
-        If you did not sign up for this service, please ignore this email.
-        """
-        
-        # Attach parts
-        part1 = MIMEText(text_content, "plain")
-        part2 = MIMEText(html_content, "html")
-        message.attach(part1)
-        message.attach(part2)
+        message = build_verification_message(email, verification_url)
         
         # Debug info
         print(f"Sending email to: {email}")
@@ -100,4 +140,103 @@ async def send_verification_email(email: str, token: str):
         print(f"=== END VERIFICATION INFO ===\n")
         
         # Still return False to prevent user creation
-        return False 
\ No newline at end of file
+        return False 
+
+def build_verification_url(email: str, token: str) -> str:
+    return f"http://localhost:8000/auth/verify?email={email}&token={token}"
+
+def build_invite_url(email: str, token: str) -> str:
+    return f"http://localhost:8000/auth/accept-invite?email={email}&token={token}"
+
+def _connect_smtp() -> smtplib.SMTP:
+    server = smtplib.SMTP(config.MAIL_SERVER, config.MAIL_PORT)
+    try:
+        server.ehlo()
+        server.starttls()
+        server.ehlo()
+        server.login(config.MAIL_FROM, config.MAIL_PASSWORD)
+    except Exception:
+        _close_smtp(server)
+        raise
+    return server
+
+def _close_smtp(server: Optional[smtplib.SMTP]):
+    if server is None:
+        return
+    try:
+        server.quit()
+    except Exception:
+        server.close()
+
+def _send_verification_batch(recipients: List[Tuple[str, str]], invite: bool = False) -> List[str]:
+    """Send a batch of verification or invitation emails over a single SMTP connection.
+    
+    A failed message does not stop the batch; the connection is reopened if
+    it was lost. Returns the emails that could not be sent.
+    """
+    server = None
+    failed = []
+    for index, (email, token) in enumerate(recipients):
+        if invite:
+            message = build_invite_message(email, build_invite_url(email, token))
+        else:
+            message = build_verification_message(email, build_verification_url(email, token))
+        try:
+            if server is None:
+                server = _connect_smtp()
+        except (smtplib.SMTPException, OSError) as e:
+            # No connection means nothing else in the batch can go out either
+            logger.error(f"Could not connect to SMTP server: {str(e)}")
+            failed.extend(email for email, _ in recipients[index:])
+            break
+        try:
+            server.sendmail(config.MAIL_FROM, email, message.as_string())
+        except smtplib.SMTPRecipientsRefused as e:
+            logger.error(f"SMTP refused recipient {email}: {str(e)}")
+            failed.append(email)
+        except (smtplib.SMTPException, OSError) as e:
+            logger.error(f"Failed to send verification email to {email}: {str(e)}")
+            failed.append(email)
+            # The connection may be in an unknown state; open a fresh one
+            _close_smtp(server)
+            server = None
+    _close_smtp(server)
+    return failed
+
+async def send_verification_emails(recipients: List[Tuple[str, str]], invite: bool = False) -> int:
+    """Send verification emails for (email, token) pairs in batches.
+    
+    With ``invite`` the emails are invitations to choose a password instead.
+    Each batch reuses one SMTP connection and runs in a worker thread so the
+    event loop is never blocked. Returns the number of emails sent.
+    """
+    build_url = build_invite_url if invite else build_verification_url
+    if config.DEV_MODE or config.BYPASS_EMAIL_VERIFICATION:
+        # Print links for development purposes, as for single signups
+        print("\n=== DEVELOPMENT MODE ===")
+        for email, token in recipients:
+            print(f"{'Invitation' if invite else 'Verification'} URL for {email}: {build_url(email, token)}")
+        print("=== END DEVELOPMENT INFO ===\n")
+    
+    loop = asyncio.get_running_loop()
+    failed = []
+    batch_size = config.EMAIL_BATCH_SIZE
+    for start in range(0, len(recipients), batch_size):
+        batch = recipients[start:start + batch_size]
+        try:
+            failed += await loop.run_in_executor(None, _send_verification_batch, batch, invite)
+        except Exception as e:
+            logger.error(f"Failed to send verification email batch: {str(e)}")
+            print(f"Email batch sending error: {str(e)}")
+            failed += [email for email, _ in batch]
+    
+    # These users were created but never got a link; they can request a
+    # new one through /auth/resend-verification
+    for email in failed:
+        logger.error(f"Verification email not sent to {email}")
+        print(f"Verification email not sent to {email}")
+    
+    sent = len(recipients) - len(failed)
+    logger.info(f"Sent {sent} of {len(recipients)} verification emails")
+    print(f"Sent {sent} of {len(recipients)} verification emails")
+    return sent
@@ -0,0 +1,51 @@
+from typing import Iterable
+
+import orjson
+from fastapi.responses import Response
+
+def file_to_dict(file: dict) -> dict:
+    """Project a file metadata document onto the FileResponse fields.
+
+    Keys and defaults must stay in step with ``models.user.FileResponse`` so
+    the fast path returns exactly what the Pydantic path would.
+    """
+    return {
+        "id": str(file["_id"]),
+        "filename": file["filename"],
+        "file_type": file["file_type"],
+        "size": file["size"],
+        "upload_date": file["upload_date"],
+        "download_url": None,
+        "download_count": file.get("download_count", 0),
+        "bytes_served": file.get("bytes_served", 0),
+        "version": file.get("version", 1)
+    }
+
+def version_to_dict(version: dict) -> dict:
+    """Project a file version record onto the FileVersion fields"""
+    return {
+        "version": version["version"],
+        "filename": version["filename"],
+        "size": version["size"],
+        "stored_bytes": version["stored_bytes"],
+        "upload_date": version["upload_date"],
+        "uploaded_by": version["uploaded_by"]
+    }
+
+def audit_event_to_dict(event: dict) -> dict:
+    """Project an audit event document onto the AuditEvent fields"""
+    return {
+        "action": event["action"],
+        "user_id": event["user_id"],
+        "file_id": event["file_id"],
+        "timestamp": event["timestamp"].isoformat(),
+        "ip_address": event.get("ip_address")
+    }
+
+def json_response(items: Iterable[dict]) -> Response:
+    """Encode already-shaped dicts straight to a JSON response.
+
+    Returning a Response makes FastAPI skip its own validation and encoding
+    of ``response_model``, which is still used for the OpenAPI schema.
+    """
+    return Response(content=orjson.dumps(list(items)), media_type="application/json")
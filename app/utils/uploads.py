@@ -0,0 +1,118 @@
+import os
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+    from multipart.exceptions import MultipartParseError
+
+class UploadTooLarge(Exception):
+    """Raised as soon as the streamed file passes its size limit"""
+
+class InvalidUpload(ValueError):
+    """Raised when the body is not multipart or carries no file in the expected field"""
+
+async def receive_upload(
+    request: Request,
+    destination: str,
+    limit: int,
+    field_name: str = "file",
+    check_filename: Optional[Callable[[str], None]] = None
+) -> Tuple[str, int]:
+    """Stream one file field of a multipart body to ``destination``.
+
+    The body is parsed as it arrives instead of being spooled first, so
+    ``limit`` is enforced on the running byte count whether or not the
+    client sent Content-Length, and nothing is written past it.
+    ``check_filename`` runs as soon as the part headers arrive, before any
+    file data is written; exceptions it raises propagate. Returns the
+    client's filename and the number of bytes written. On any error the
+    partial file is removed.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise InvalidUpload("Expected a multipart/form-data body")
+
+    # The parser calls back synchronously; collect what it saw per block
+    events: List[Tuple[str, object]] = []
+    part_headers: dict = {}
+    header_field = bytearray()
+    header_value = bytearray()
+
+    def on_part_begin():
+        part_headers.clear()
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        part_headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        events.append(("headers", part_headers.get(b"content-disposition", b"")))
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+
+    output = None
+    filename = None
+    written = 0
+    try:
+        async for block in request.stream():
+            try:
+                parser.write(block)
+            except MultipartParseError as e:
+                raise InvalidUpload(f"Malformed multipart body: {str(e)}")
+            for kind, value in events:
+                if kind == "headers" and output is None:
+                    _, options = parse_options_header(value)
+                    if options.get(b"name", b"").decode("latin-1") != field_name or b"filename" not in options:
+                        continue
+                    filename = options[b"filename"].decode("utf-8", "replace")
+                    if check_filename:
+                        check_filename(filename)
+                    output = open(destination, "wb")
+                elif kind == "data" and output is not None:
+                    written += len(value)
+                    if written > limit:
+                        raise UploadTooLarge()
+                    output.write(value)
+                elif kind == "end" and output is not None:
+                    # Only the file part matters; the rest of the body is not read
+                    output.close()
+                    return filename, written
+            events.clear()
+    except BaseException:
+        if output is not None:
+            output.close()
+            os.remove(destination)
+        raise
+
+    if output is not None:
+        # The body ended in the middle of the file part
+        output.close()
+        os.remove(destination)
+        raise InvalidUpload("Malformed multipart body: unexpected end of body")
+    raise InvalidUpload(f"A file must be sent in the '{field_name}' form field")
@@ -0,0 +1,161 @@
+"""
+Per-operation latency of each metadata repository backend.
+
+Run from the project root:
+
+    python -m benchmarks.repository_bench [--ops 2000] [--backends memory,sqlite,mongo]
+
+The Mongo backend uses a throwaway database (DATABASE_NAME + "_bench") that is
+dropped afterwards, and is skipped if MongoDB is not reachable.
+"""
+
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import tempfile
+import time
+
+from app.core import config
+
+async def timed(results: dict, name: str, calls):
+    """Await each coroutine factory in ``calls`` and record its latency"""
+    samples = []
+    for call in calls:
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    results[name] = samples
+
+async def run_backend(repo, ops: int) -> dict:
+    await repo.init()
+    results = {}
+    run_id = os.urandom(4).hex()
+
+    users = [
+        {
+            "username": f"bench_{run_id}_{i}",
+            "email": f"bench_{run_id}_{i}@example.com",
+            "hashed_password": "x" * 60,
+            "user_type": "client",
+            "is_verified": False,
+            "verification_token": f"token_{i}"
+        }
+        for i in range(ops)
+    ]
+    user_ids = []
+
+    async def add_user(user):
+        user_ids.append(str((await repo.add_user(user))["_id"]))
+
+    await timed(results, "add_user", [lambda user=user: add_user(user) for user in users])
+    await timed(results, "find_user_by_email", [
+        lambda user=user: repo.find_user_by_email(user["email"]) for user in users
+    ])
+    await timed(results, "find_user_by_id", [
+        lambda user_id=user_id: repo.find_user_by_id(user_id) for user_id in user_ids
+    ])
+    await timed(results, "verify_token", [
+        lambda user=user: repo.verify_token(user["email"], user["verification_token"]) for user in users
+    ])
+
+    file_ids = []
+
+    async def add_file(i):
+        file = await repo.add_file({
+            "filename": f"deck_{i}.pptx",
+            "stored_filename": f"bench_{run_id}_{i}.pptx",
+            "file_path": f"/tmp/bench_{run_id}_{i}.pptx",
+            "file_type": "pptx",
+            "size": 1024 * (i % 100 + 1),
+            "uploaded_by": user_ids[i % len(user_ids)]
+        })
+        file_ids.append(str(file["_id"]))
+
+    await timed(results, "add_file", [lambda i=i: add_file(i) for i in range(ops)])
+    await timed(results, "get_file_by_id", [
+        lambda file_id=file_id: repo.get_file_by_id(file_id) for file_id in file_ids
+    ])
+    await timed(results, "get_storage_usage", [
+        lambda user_id=user_id: repo.get_storage_usage(user_id) for user_id in user_ids
+    ])
+    await timed(results, "list_all_files(100)", [
+        lambda: repo.list_all_files(100) for _ in range(max(1, ops // 20))
+    ])
+
+    now = datetime.datetime.utcnow()
+    batches = [file_ids[i:i + 100] for i in range(0, len(file_ids), 100)]
+    await timed(results, "increment_file_stats(100)", [
+        lambda batch=batch: repo.increment_file_stats({file_id: [1, 1024] for file_id in batch}, now)
+        for batch in batches
+    ])
+    await timed(results, "get_top_files(100)", [
+        lambda: repo.get_top_files(100) for _ in range(max(1, ops // 20))
+    ])
+
+    events = [
+        {"action": "download", "user_id": user_ids[i % len(user_ids)], "file_id": file_ids[i], "timestamp": now}
+        for i in range(ops)
+    ]
+    await timed(results, "add_audit_events(500)", [
+        lambda i=i: repo.add_audit_events([dict(event) for event in events[i:i + 500]])
+        for i in range(0, len(events), 500)
+    ])
+    await timed(results, "query_audit_events(user)", [
+        lambda user_id=user_id: repo.query_audit_events(user_id=user_id, limit=100)
+        for user_id in user_ids[:max(1, ops // 10)]
+    ])
+    await timed(results, "delete_file", [
+        lambda file_id=file_id: repo.delete_file(file_id) for file_id in file_ids
+    ])
+    return results
+
+def create_backend(name: str, workdir: str):
+    if name == "memory":
+        from app.db.memory import MemoryRepository
+        return MemoryRepository()
+    if name == "sqlite":
+        from app.db.sqlite import SQLiteRepository
+        return SQLiteRepository(os.path.join(workdir, "bench.db"))
+    if name == "mongo":
+        from app.db.mongo import MongoRepository
+        return MongoRepository(config.MONGODB_URL, f"{config.DATABASE_NAME}_bench", config.COLLECTION_NAME)
+    raise ValueError(f"Unknown backend: {name}")
+
+def print_results(name: str, results: dict):
+    print(f"\n{name}")
+    print(f"{'operation':<28}{'calls':>8}{'mean us':>12}{'p50 us':>12}{'p99 us':>12}")
+    for operation, samples in results.items():
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        print(
+            f"{operation:<28}{len(samples):>8}"
+            f"{statistics.mean(samples) * 1e6:>12.1f}"
+            f"{statistics.median(samples) * 1e6:>12.1f}"
+            f"{p99 * 1e6:>12.1f}"
+        )
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark metadata repository backends")
+    parser.add_argument("--ops", type=int, default=2000, help="Users/files created per backend")
+    parser.add_argument("--backends", default="memory,sqlite,mongo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.backends.split(","):
+            try:
+                repo = create_backend(name, workdir)
+                await repo.ping()
+            except Exception as e:
+                print(f"\nSkipping {name}: {e}")
+                continue
+            try:
+                print_results(name, await run_backend(repo, args.ops))
+            finally:
+                if name == "mongo":
+                    await repo.client.drop_database(repo.database.name)
+                await repo.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+"""
+Per-item cost of serializing a /files/list page.
+
+Compares the old path (build a FileResponse model per document, let FastAPI
+validate it against response_model and encode it with the standard JSON
+encoder) with the fast path (project documents to dicts and encode them with
+orjson). Run from the project root:
+
+    python -m benchmarks.serialization_bench [--items 10000] [--rounds 20]
+"""
+
+import argparse
+import datetime
+import json
+import secrets
+import statistics
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.models.user import FileResponse as FileResponseModel
+from app.utils.serialization import file_to_dict, json_response
+
+def make_documents(count: int) -> List[dict]:
+    now = datetime.datetime.now()
+    return [
+        {
+            "_id": secrets.token_hex(12),
+            "filename": f"quarterly_review_{i}.pptx",
+            "stored_filename": f"ops_admin1_{i}.pptx",
+            "file_path": f"/srv/uploads/ops_admin1_{i}.pptx",
+            "file_type": "pptx",
+            "size": 1024 * (i % 5000 + 1),
+            "uploaded_by": secrets.token_hex(12),
+            "upload_date": (now - datetime.timedelta(minutes=i)).isoformat(),
+            "download_count": i % 97,
+            "bytes_served": (i % 97) * 1024
+        }
+        for i in range(count)
+    ]
+
+def model_path(documents: List[dict], adapter: TypeAdapter) -> bytes:
+    models = [
+        FileResponseModel(
+            id=str(file["_id"]),
+            filename=file["filename"],
+            file_type=file["file_type"],
+            size=file["size"],
+            upload_date=file["upload_date"],
+            download_count=file.get("download_count", 0),
+            bytes_served=file.get("bytes_served", 0)
+        ) for file in documents
+    ]
+    # What FastAPI does with a response_model: validate, serialize, encode
+    validated = adapter.validate_python(models)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def fast_path(documents: List[dict]) -> bytes:
+    return json_response(file_to_dict(file) for file in documents).body
+
+def measure(fn, rounds: int) -> List[float]:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /files/list serialization")
+    parser.add_argument("--items", type=int, default=10000, help="Documents per page")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    documents = make_documents(args.items)
+    adapter = TypeAdapter(List[FileResponseModel])
+
+    # Both paths must produce the same JSON
+    assert json.loads(model_path(documents, adapter)) == json.loads(fast_path(documents))
+
+    print(f"{args.items} items per page, {args.rounds} rounds")
+    print(f"{'path':<12}{'page ms':>12}{'per item us':>14}")
+    for name, fn in (("model", lambda: model_path(documents, adapter)), ("fast", lambda: fast_path(documents))):
+        page = statistics.median(measure(fn, args.rounds))
+        print(f"{name:<12}{page * 1e3:>12.2f}{page / args.items * 1e6:>14.3f}")
+
+if __name__ == "__main__":
+    main()